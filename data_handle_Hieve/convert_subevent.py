@@ -1,3 +1,4 @@
+import argparse
 import os
 import json
 import copy
@@ -8,12 +9,15 @@ from tqdm import tqdm
 import networkx as nx
 
 from template import TASK_DESC_SUBEVENT
+from render import DocumentRenderer
+from permutation import EventPermutation
 
 
 class Document:
     def __init__(self, data, dataname):
         self.id = data["id"]
         self.text = data["text"]
+        self.renderer = DocumentRenderer(self.text, tokenized=False)
         self.events = data["events"]
         self.relations = data["relations"]
         self.dataname = dataname.lower()
@@ -91,7 +95,8 @@ def filter_golden_events(doc, split_events_sorted):
         map_id = doc.event_id2num[event_id]
         mention = doc.events_all_id2mention[event_id]
         tagged_events.append("<" + map_id + " " + mention + ">")
-    return tagged_events
+    # membership is tested once per candidate of every relation type
+    return set(tagged_events)
 
 
 def choose_choices(map_id, choices, tagged_events):
@@ -112,7 +117,7 @@ def choose_choices(map_id, choices, tagged_events):
 
 
 
-def convert_data(data_path, new_data_path, split):
+def convert_data(data_path, new_data_path, split, half=False):
     examples = []
     examples_pos, examples_neg = [], []
     doc_split_num = []
@@ -122,11 +127,18 @@ def convert_data(data_path, new_data_path, split):
     for line in tqdm(lines):
         data = json.loads(line.strip())
         doc = Document(data, "hievents")
+        permutation = EventPermutation(doc.events_sorted)
 
         for item in doc.events_sorted:
             map_id = doc.event_id2num[item["id"]]
 
-            n = len(doc.events_sorted) - 1
+            # half: SuperSub/SubSuper are inverse and Coref is symmetric, every pair is asked from its earlier event
+            order = permutation.shuffle(item, random, later_only=half)
+            if half and not order:
+                doc_split_num.append(0)
+                continue
+
+            n = len(order)
             if n == 0:
                 pass
             k = 30
@@ -136,34 +148,10 @@ def convert_data(data_path, new_data_path, split):
             sizes = [min_size + 1 if i < extra else min_size for i in range(m)]
             doc_split_num.append(m)
 
-            new_events = copy.deepcopy(doc.events_sorted)
-            new_events.remove(item)
-            random.shuffle(new_events)
-
-            index = 0
-            for size in sizes:
-                split_events = new_events[index:index + size]
-                index += size
-                split_events.append(item)
-                split_events_sorted = sorted(split_events, key=lambda x: (x["sent_id"], x["offset"][0]))
-
-                new_sent_list = []
-                for sent_id, sent in enumerate(doc.text):
-                    new_sent = []
-                    offset = 0
-                    for event in split_events_sorted:
-                        if sent_id == event["sent_id"]:
-                            event_map = doc.event_id2num[event["id"]]
-                            sp1 = event["offset"][0]
-                            sp2 = event["offset"][1]
-                            new_sent.extend(sent[offset: sp1])
-                            new_sent.extend(["<" + event_map + " "])
-                            new_sent.extend(sent[sp1: sp2])
-                            new_sent.extend([">"])
-                            offset = sp2
-                    new_sent.extend(sent[offset:])
-                    new_sent_list.append("".join(new_sent))
-                text = " ".join(new_sent_list)
+            for split_events_sorted in permutation.split(item, order, sizes):
+                marks = [(event["sent_id"], event["offset"][0], event["offset"][1], doc.event_id2num[event["id"]])
+                         for event in split_events_sorted]
+                text = doc.renderer.render(marks)
 
                 instruction = TASK_DESC_SUBEVENT
                 mention = doc.events_all_id2mention[item['id']]
@@ -209,6 +197,11 @@ def convert_data(data_path, new_data_path, split):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--half", action="store_true",
+                        help="Ask every pair of events only once from its earlier event, written to Hieve_half.")
+    args = parser.parse_args()
+
     file_path = os.path.dirname(__file__)
     project_path = os.path.abspath(os.path.join(file_path, ".."))
     print(project_path)
@@ -219,13 +212,14 @@ if __name__ == "__main__":
 
     dataset_name = "Hieve"
     data_path = os.path.join(project_path, f"data/processed/hievents")
-    new_data_path = os.path.join(project_path, f"data/converted/{dataset_name}")
+    new_dataset_name = f"{dataset_name}_half" if args.half else dataset_name
+    new_data_path = os.path.join(project_path, f"data/converted/{new_dataset_name}")
 
     if not os.path.exists(new_data_path):
         os.makedirs(new_data_path)
 
     split_list = ["train", "dev", "test"]
     for split in split_list:
-        convert_data(data_path, new_data_path, split)
+        convert_data(data_path, new_data_path, split, half=args.half)
 
     print("finish")
@@ -0,0 +1,50 @@
+class DocumentRenderer:
+    """
+    render the document text with a subset of events marked as <map_id trigger>;
+    sentences without marked events are joined once per document and reused for every partition
+    """
+
+    def __init__(self, sentences, tokenized=True):
+        # tokenized: sentences are token lists (MAVEN-ERE), otherwise strings with char offsets (MATRES, HiEve)
+        self.sentences = sentences
+        self.tokenized = tokenized
+        if tokenized:
+            self.plain_sentences = [" ".join(sent) for sent in sentences]
+        else:
+            self.plain_sentences = list(sentences)
+
+    def render_sentence(self, sent, marks):
+        new_sent = []
+        offset = 0
+        if self.tokenized:
+            for sp1, sp2, map_id in marks:
+                # Events are marked with special symbols
+                new_sent.extend(sent[offset: sp1])
+                new_sent.append("<" + map_id)
+                new_sent.append(" ".join(sent[sp1: sp2]) + ">")
+                offset = sp2
+            new_sent.extend(sent[offset:])
+            return " ".join(new_sent)
+
+        for sp1, sp2, map_id in marks:
+            new_sent.append(sent[offset: sp1])
+            new_sent.append("<" + map_id + " ")
+            new_sent.append(sent[sp1: sp2])
+            new_sent.append(">")
+            offset = sp2
+        new_sent.append(sent[offset:])
+        return "".join(new_sent)
+
+    def render(self, marks):
+        """
+        marks: (sent_id, start, end, map_id) of the tagged events, sorted by (sent_id, start)
+        """
+        sent_marks = {}
+        for sent_id, sp1, sp2, map_id in marks:
+            if 0 <= sent_id < len(self.sentences):
+                sent_marks.setdefault(sent_id, []).append((sp1, sp2, map_id))
+
+        new_sent_list = list(self.plain_sentences)
+        for sent_id, marks_item in sent_marks.items():
+            new_sent_list[sent_id] = self.render_sentence(self.sentences[sent_id], marks_item)
+        return " ".join(new_sent_list)
@@ -6,12 +6,14 @@ import math
 from tqdm import tqdm
 
 from template import TASK_DESC_TEMPORAL
+from render import DocumentRenderer
 
 
 class Document:
     def __init__(self, data, dataname):
         self.id = data["fid"]
         self.text = data["text"]
+        self.renderer = DocumentRenderer(self.text, tokenized=False)
         self.events = data["events"]
         if dataname.lower() == "tb-dense":
             self.events += data["timexes"]
@@ -116,7 +118,8 @@ def filter_golden_events(doc, split_events_sorted):
         event_id = event["eiid"]
         mention = doc.events_all_id2mention[event_id]
         tagged_events.append("<" + map_id + " " + mention + ">")
-    return tagged_events
+    # membership is tested once per candidate of every relation type
+    return set(tagged_events)
 
 
 def choose_choices(map_id, choices, tagged_events):
@@ -162,7 +165,7 @@ def convert_data(data_path, new_data_path, split):
             sizes = [min_size + 1 if i < extra else min_size for i in range(m)]
             doc_split_num.append(m)
 
-            new_events = copy.deepcopy(doc.candidate_events[item])
+            new_events = list(doc.candidate_events[item])
             random.shuffle(new_events)
 
             index = 0
@@ -172,24 +175,9 @@ def convert_data(data_path, new_data_path, split):
                 split_events.append(item)
                 split_events_sorted = sorted(split_events, key=lambda x: int(x[1:]))
 
-                new_sent_list = []
-                for sent_id, sent in enumerate(doc.text):
-                    new_sent = []
-                    offset = 0
-                    for event_num in split_events_sorted:
-                        event = doc.enum2events[event_num]
-                        if sent_id == event["sent_id"]:
-                            event_map = event_num
-                            sp1 = event["offset"][0]
-                            sp2 = event["offset"][1]
-                            new_sent.extend(sent[offset: sp1])
-                            new_sent.extend(["<" + event_map + " "])
-                            new_sent.extend(sent[sp1: sp2])
-                            new_sent.extend([">"])
-                            offset = sp2
-                    new_sent.extend(sent[offset:])
-                    new_sent_list.append("".join(new_sent))
-                text = " ".join(new_sent_list)
+                marks = [(doc.enum2events[event_num]["sent_id"], doc.enum2events[event_num]["offset"][0],
+                          doc.enum2events[event_num]["offset"][1], event_num) for event_num in split_events_sorted]
+                text = doc.renderer.render(marks)
 
                 instruction = TASK_DESC_TEMPORAL
                 mention = doc.events_all_id2mention[doc.enum2events[item]['eiid']]
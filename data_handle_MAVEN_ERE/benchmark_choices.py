@@ -0,0 +1,98 @@
+import argparse
+import os
+import json
+import math
+import random
+import time
+
+from document import Document, filter_golden_events, choose_choices
+
+
+def get_partitions(doc, rng, k=30):
+    partitions = []
+    for item in doc.events_all:
+        new_events = [event for event in doc.events_all if event is not item]
+        rng.shuffle(new_events)
+        n = len(new_events)
+        m = math.ceil(n / k) if n > 0 else 1
+        sizes = [n // m + 1 if i < n % m else n // m for i in range(m)]
+        index = 0
+        for size in sizes:
+            split_events = new_events[index:index + size] + [item]
+            index += size
+            partitions.append((doc.id2node[item["id"]], split_events))
+    return partitions
+
+
+def get_string_choices(doc, labels_dict):
+    # the string choices that choose_choices looked up before the node indexes
+    rel_choices = {}
+    for rel, choices in labels_dict.items():
+        rel_choices[rel] = {doc.node2map_id[node]: [doc.node_tags[tail] for tail in choices.tails(node)]
+                            for node in range(len(doc.node_tags)) if len(choices.tails(node)) > 0}
+    return rel_choices
+
+
+def choose_choices_list(map_id, choices, tagged_events):
+    res = []
+    if map_id in choices.keys():
+        for i in choices[map_id]:
+            if i in tagged_events:
+                res.append(i)
+    res_text = ", ".join(res) if len(res) > 0 else "none"
+    return res_text, res
+
+
+def run_list(doc, partitions, string_choices):
+    for node, split_events in partitions:
+        map_id = doc.node2map_id[node]
+        tagged_events = [doc.node_tags[doc.id2node[event["id"]]] for event in split_events]
+        for choices in string_choices.values():
+            choose_choices_list(map_id, choices, tagged_events)
+
+
+def run_bitmap(doc, partitions, labels_dicts):
+    for node, split_events in partitions:
+        tagged_events = filter_golden_events(doc, split_events)
+        for choices in labels_dicts.values():
+            choose_choices(doc, node, choices, tagged_events)
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--split", type=str, default="train",
+                        help="The split of data/MAVEN_ERE_split to benchmark on.")
+    parser.add_argument("--top_k", type=int, default=10, help="Benchmark the k documents with the most events.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Time every document this many times and keep the fastest run.")
+    args = parser.parse_args()
+
+    file_path = os.path.dirname(__file__)
+    project_path = os.path.abspath(os.path.join(file_path, ".."))
+    data_path = os.path.join(project_path, f"data/MAVEN_ERE_split/{args.split}.jsonl")
+
+    with open(data_path) as f:
+        docs = [Document(json.loads(line.strip())) for line in f]
+    docs = sorted(docs, key=lambda x: len(x.events_all), reverse=True)[:args.top_k]
+
+    time_list, time_bitmap = 0.0, 0.0
+    for doc in docs:
+        partitions = get_partitions(doc, random.Random(doc.id))
+        labels_dicts = dict(doc.temporal_labels_dict)
+        labels_dicts["coreference"] = doc.coref_labels_dict["coreference"]
+        string_choices = get_string_choices(doc, labels_dicts)
+
+        doc_time_list = min(measure(run_list, doc, partitions, string_choices) for _ in range(args.repeat))
+        doc_time_bitmap = min(measure(run_bitmap, doc, partitions, labels_dicts) for _ in range(args.repeat))
+        time_list += doc_time_list
+        time_bitmap += doc_time_bitmap
+        print(f"{doc.id}: events={len(doc.events_all)}, partitions={len(partitions)}, "
+              f"list={doc_time_list * 1000:.2f}ms, bitmap={doc_time_bitmap * 1000:.2f}ms, "
+              f"speedup={doc_time_list / doc_time_bitmap:.2f}x")
+    print(f"total: list={time_list:.3f}s, bitmap={time_bitmap:.3f}s, speedup={time_list / time_bitmap:.2f}x")
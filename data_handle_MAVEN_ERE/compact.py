@@ -0,0 +1,96 @@
+import argparse
+import json
+
+from render import DocumentRenderer
+
+INPUT_PREFIX = "Document content: "
+
+
+def make_example(doc, instruction, marks, sample_desc, output, compact=False):
+    """
+    compact examples keep the marks of the tagged events instead of the rendered document text,
+    the document body itself is shared by all examples of the document
+    """
+    if compact:
+        return {"instruction": instruction, "document": doc.body, "marks": marks,
+                "sample_desc": sample_desc, "output": output}
+    item_input = INPUT_PREFIX + doc.renderer.render(marks) + "\n" + sample_desc
+    return {"instruction": instruction, "input": item_input, "output": output}
+
+
+def compact_examples(examples):
+    """
+    store every instruction and every document body once, examples refer to them by index and document id
+    """
+    instructions, instruction2index, documents = [], {}, {}
+    new_examples = []
+    for example in examples:
+        instruction = example["instruction"]
+        if instruction not in instruction2index:
+            instruction2index[instruction] = len(instructions)
+            instructions.append(instruction)
+        document = example["document"]
+        if document["id"] not in documents:
+            documents[document["id"]] = document["sentences"]
+        new_examples.append({"instruction": instruction2index[instruction], "document": document["id"],
+                             "marks": example["marks"], "sample_desc": example["sample_desc"],
+                             "output": example["output"]})
+    return {"instructions": instructions, "documents": documents, "examples": new_examples}
+
+
+def merge_datasets(datasets):
+    """
+    concatenate the examples of several compact datasets, documents with the same id are stored once
+    """
+    instructions, instruction2index, documents = [], {}, {}
+    examples = []
+    for dataset in datasets:
+        index_map = []
+        for instruction in dataset["instructions"]:
+            if instruction not in instruction2index:
+                instruction2index[instruction] = len(instructions)
+                instructions.append(instruction)
+            index_map.append(instruction2index[instruction])
+        documents.update(dataset["documents"])
+        for example in dataset["examples"]:
+            example = dict(example)
+            example["instruction"] = index_map[example["instruction"]]
+            examples.append(example)
+    return {"instructions": instructions, "documents": documents, "examples": examples}
+
+
+def expand_examples(dataset):
+    """
+    yield the Alpaca-style examples of a compact dataset, the same dicts that output_format="json" writes
+    """
+    renderers = {}
+    for example in dataset["examples"]:
+        doc_id = example["document"]
+        if doc_id not in renderers:
+            renderers[doc_id] = DocumentRenderer(dataset["documents"][doc_id])
+        item_input = INPUT_PREFIX + renderers[doc_id].render(example["marks"]) + "\n" + example["sample_desc"]
+        yield {"instruction": dataset["instructions"][example["instruction"]], "input": item_input,
+               "output": example["output"]}
+
+
+def load_compact(file):
+    with open(file) as f:
+        return json.load(f)
+
+
+def dump_compact(dataset, file):
+    with open(file, "w") as f:
+        json.dump(dataset, f, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=str, required=True, help="A {split}.compact.json file.")
+    parser.add_argument("--output", type=str, required=True, help="The expanded Alpaca-style JSON file.")
+    args = parser.parse_args()
+
+    examples = list(expand_examples(load_compact(args.input)))
+    with open(args.output, "w") as f:
+        json.dump(examples, f, indent=4, ensure_ascii=False)
+
+    print("finish")
@@ -0,0 +1,121 @@
+import argparse
+import os
+from functools import partial
+
+import convert_temporal
+import convert_causal
+import convert_subevent
+import convert_coref
+from engine import convert_documents
+from partition import get_partitioner
+from writer import ExampleWriter
+
+TASK_MODULES = {
+    "temporal": convert_temporal,
+    "causal": convert_causal,
+    "subevent": convert_subevent,
+    "coref": convert_coref,
+}
+# the tasks whose outputs contain multi-hop reasoning paths
+PATH_TASKS = ["causal", "subevent"]
+# the tasks that support asking every pair of events only once, see INVERSE_REL
+HALF_TASKS = ["temporal", "subevent"]
+
+
+def get_task_dir(task, half=False, targets_per_prompt=1):
+    if half and task in HALF_TASKS:
+        return f"{task}_half"
+    if targets_per_prompt > 1:
+        return f"{task}_multi"
+    return task
+
+
+def convert_data(data_path, new_data_root, split, tasks, seed=42, num_workers=1, output_format="json",
+                 partitioner=None, max_hops=None, max_paths=None, half=False, targets_per_prompt=1):
+    """
+    read and parse every document of the split once, and emit the prompts of all given tasks from it;
+    each task produces the same files as its own convert_{task}.py
+    """
+    modules = [TASK_MODULES[task] for task in tasks]
+    new_data_paths = [os.path.join(new_data_root, get_task_dir(task, half, targets_per_prompt)) for task in tasks]
+    writers = [ExampleWriter(new_data_path, split, output_format, subsample=split == "train")
+               for new_data_path in new_data_paths]
+    doc_split_nums = [[] for _ in tasks]
+    doc_groups_list = [[] if targets_per_prompt > 1 else None for _ in tasks]
+    with open(os.path.join(data_path, f"{split}.jsonl")) as f:
+        lines = f.readlines()
+
+    convert_functions = []
+    for task, module in zip(tasks, modules):
+        kwargs = {"compact": output_format == "compact", "partitioner": partitioner}
+        if task in PATH_TASKS:
+            kwargs.update(max_hops=max_hops, max_paths=max_paths)
+        if half and task in HALF_TASKS:
+            kwargs.update(half=True)
+        kwargs.update(targets_per_prompt=targets_per_prompt)
+        convert_functions.append(partial(module.convert_document, **kwargs))
+    for results in convert_documents(lines, convert_functions, seed, num_workers):
+        for module, writer, doc_split_num, doc_groups, (doc_examples, doc_split_num_item, doc_groups_item) in \
+                zip(modules, writers, doc_split_nums, doc_groups_list, results):
+            doc_split_num.extend(doc_split_num_item)
+            if doc_groups is not None:
+                doc_groups.extend(doc_groups_item)
+            for item_dict in doc_examples:
+                writer.add(item_dict, negative=module.is_negative(item_dict))
+
+    for task, module, writer, doc_split_num, doc_groups, new_data_path in \
+            zip(tasks, modules, writers, doc_split_nums, doc_groups_list, new_data_paths):
+        print(f"Task: {task}")
+        module.finish_split(writer, doc_split_num, new_data_path, split, seed, doc_groups)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=str, nargs="+", default=list(TASK_MODULES.keys()),
+                        choices=list(TASK_MODULES.keys()), help="The tasks to convert in one pass over the data.")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Seed of the per-document random state used for partitioning and sampling.")
+    parser.add_argument("--num_workers", type=int, default=1,
+                        help="Number of worker processes converting documents in parallel.")
+    parser.add_argument("--output_format", type=str, default="json", choices=["json", "jsonl", "compact"],
+                        help="Write one JSON array per split, stream one example per line into a JSONL file, "
+                             "or store every instruction and document body once in a {split}.compact.json file.")
+    parser.add_argument("--max_length", type=int, default=None,
+                        help="Pack the candidate events into prompts of at most max_length tokens "
+                             "instead of at most 30 candidate events per prompt.")
+    parser.add_argument("--tokenizer", type=str, default=None,
+                        help="Local tokenizer path used to count the prompt tokens, whitespace words by default.")
+    parser.add_argument("--max_hops", type=int, default=None,
+                        help="Maximal number of relations of a multi-hop reasoning path.")
+    parser.add_argument("--max_paths", type=int, default=None,
+                        help="Sample the reasoning path of a relation from its first max_paths valid paths only.")
+    parser.add_argument("--half", action="store_true",
+                        help="Ask every pair of events only once from its earlier event for the temporal and subevent "
+                             "tasks, written to {task}_half.")
+    parser.add_argument("--targets_per_prompt", type=int, default=1,
+                        help="Pack several consecutive target events into every prompt, written to {task}_multi.")
+    args = parser.parse_args()
+    if args.half and args.targets_per_prompt > 1:
+        parser.error("--half can not be combined with --targets_per_prompt")
+
+    file_path = os.path.dirname(__file__)
+    project_path = os.path.abspath(os.path.join(file_path, ".."))
+    print(project_path)
+
+    dataset_name = "MAVEN_ERE"
+    data_path = os.path.join(project_path, f"data/MAVEN_ERE_split")
+    new_data_root = os.path.join(project_path, f"data/converted/{dataset_name}")
+
+    for task in args.tasks:
+        task_dir = get_task_dir(task, args.half, args.targets_per_prompt)
+        if not os.path.exists(os.path.join(new_data_root, task_dir)):
+            os.makedirs(os.path.join(new_data_root, task_dir))
+
+    partitioner = get_partitioner(args.max_length, args.tokenizer)
+    split_list = ["train", "valid", "test"]
+    for split in split_list:
+        convert_data(data_path, new_data_root, split, args.tasks, seed=args.seed, num_workers=args.num_workers,
+                     output_format=args.output_format, partitioner=partitioner, max_hops=args.max_hops,
+                     max_paths=args.max_paths, half=args.half, targets_per_prompt=args.targets_per_prompt)
+
+    print("finish")
@@ -0,0 +1,193 @@
+import argparse
+import os
+import json
+import random
+from functools import partial
+
+import convert_temporal
+import convert_causal
+import convert_subevent
+import convert_coref
+from constant import JOINT_SECTIONS
+from document import filter_golden_events
+from compact import make_example
+from engine import convert_documents
+from partition import EventNumPartitioner, get_partitioner
+from permutation import EventPermutation
+from paths import PathMiner
+from writer import ExampleWriter
+from template import TASK_DESC_JOINT
+
+TASK_MODULES = {
+    "temporal": convert_temporal,
+    "causal": convert_causal,
+    "subevent": convert_subevent,
+    "coref": convert_coref,
+}
+# a time expression is only asked for its temporal relations, like in the task converters
+TIMEX_TASKS = ["temporal"]
+
+
+def get_target_tasks(item):
+    return TIMEX_TASKS if item["id"].startswith("TIME") else list(TASK_MODULES.keys())
+
+
+def get_sections(output):
+    """
+    {task: section text} of a joint output, the inverse of the sections written by convert_document
+    """
+    name2task = {f"{name}:": task for task, name in JOINT_SECTIONS.items()}
+    sections = {}
+    task = None
+    for line in output.split("\n"):
+        if line in name2task:
+            task = name2task[line]
+            sections[task] = []
+        elif task is not None:
+            sections[task].append(line)
+    return {task: "\n".join(lines).strip("\n") for task, lines in sections.items()}
+
+
+def convert_document(doc, rng, compact=False, partitioner=None, max_hops=None, max_paths=None):
+    """
+    one prompt per target event and partition asking all relation families at once, the candidate events are
+    the events and time expressions like in the temporal converter; doc_tasks holds the tasks of every target
+    """
+    if partitioner is None:
+        partitioner = EventNumPartitioner()
+    get_outputs = {
+        "temporal": partial(convert_temporal.get_target_output, doc),
+        "causal": partial(convert_causal.get_target_output, doc, rng=rng,
+                          path_miner=PathMiner(convert_causal.infer_relation, max_hops, max_paths)),
+        "subevent": partial(convert_subevent.get_target_output, doc, rng=rng,
+                            path_miner=PathMiner(convert_subevent.infer_relation, max_hops, max_paths)),
+        "coref": partial(convert_coref.get_target_output, doc),
+    }
+
+    examples = []
+    doc_split_num = []
+    doc_tasks = []
+
+    permutation = EventPermutation(doc.events_all)
+    for item in doc.events_all:
+        if item["id"].startswith("TIME"):
+            map_id = doc.timex_id2num[item["id"]]
+            relation_desc = "have temporal relations"
+        else:
+            map_id = doc.event_id2num[item["id"]]
+            relation_desc = "have temporal, causal, subevent, or coreference relations"
+        node = doc.id2node[item["id"]]
+        tasks = get_target_tasks(item)
+
+        instruction = TASK_DESC_JOINT
+        mention = doc.events_all_id2mention[item['id']]
+        sample_desc = f"Please identify the events in the document that {relation_desc} " \
+                      f"with the given event <{map_id} {mention}>."
+
+        order = permutation.shuffle(item, rng)
+
+        # Document Partitioning Strategy
+        sizes = partitioner.get_sizes(doc, [item], permutation.get_events(order), instruction, sample_desc)
+        doc_split_num.append(len(sizes))
+        doc_tasks.append(tasks)
+
+        for split_events_sorted in permutation.split(item, order, sizes):
+
+            marks = doc.get_marks(split_events_sorted)
+
+            tagged_events = filter_golden_events(doc, split_events_sorted)
+            item_output = "\n\n".join(f"{JOINT_SECTIONS[task]}:\n{get_outputs[task](node, tagged_events)}"
+                                      for task in tasks)
+            item_dict = make_example(doc, instruction, marks, sample_desc, item_output, compact)
+
+            examples.append(item_dict)
+
+    return examples, doc_split_num, doc_tasks
+
+
+def is_negative(item_dict):
+    # negative only if no section has a relation
+    return all(TASK_MODULES[task].is_negative({"output": section})
+               for task, section in get_sections(item_dict["output"]).items())
+
+
+def finish_split(writer, doc_split_num, new_data_path, split, seed, doc_tasks):
+    if split == "train":
+        rng = random.Random(seed)
+        print(f"all_pos_num: {writer.num_pos}")
+        print(f"all_neg_num: {writer.num_neg}")
+        neg_num = int(writer.num_pos / 4.0)
+        print(f"keep_neg_num: {neg_num}")
+        keep_num = writer.sample(rng, neg_num)
+        print(f"keep_num: {keep_num}")
+    else:
+        file = os.path.join(new_data_path, f"{split}_doc_split_num.json")
+        with open(file, "w") as f:
+            json.dump(doc_split_num, f)
+        # the tasks asked for every target, the evaluators pick the targets and sections of their task by it
+        with open(os.path.join(new_data_path, f"{split}_doc_tasks.json"), "w") as f:
+            json.dump(doc_tasks, f)
+
+    writer.close()
+    print(f"Convert {split} finish")
+
+
+def convert_data(data_path, new_data_path, split, seed=42, num_workers=1, output_format="json", partitioner=None,
+                 max_hops=None, max_paths=None):
+    doc_split_num = []
+    doc_tasks = []
+    writer = ExampleWriter(new_data_path, split, output_format, subsample=split == "train")
+    with open(os.path.join(data_path, f"{split}.jsonl")) as f:
+        lines = f.readlines()
+
+    convert_function = partial(convert_document, compact=output_format == "compact", partitioner=partitioner,
+                               max_hops=max_hops, max_paths=max_paths)
+    for results in convert_documents(lines, [convert_function], seed, num_workers):
+        doc_examples, doc_split_num_item, doc_tasks_item = results[0]
+        doc_split_num.extend(doc_split_num_item)
+        doc_tasks.extend(doc_tasks_item)
+        for item_dict in doc_examples:
+            writer.add(item_dict, negative=is_negative(item_dict))
+
+    finish_split(writer, doc_split_num, new_data_path, split, seed, doc_tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Seed of the per-document random state used for partitioning and sampling.")
+    parser.add_argument("--num_workers", type=int, default=1,
+                        help="Number of worker processes converting documents in parallel.")
+    parser.add_argument("--output_format", type=str, default="json", choices=["json", "jsonl", "compact"],
+                        help="Write one JSON array per split, stream one example per line into a JSONL file, "
+                             "or store every instruction and document body once in a {split}.compact.json file.")
+    parser.add_argument("--max_length", type=int, default=None,
+                        help="Pack the candidate events into prompts of at most max_length tokens "
+                             "instead of at most 30 candidate events per prompt.")
+    parser.add_argument("--tokenizer", type=str, default=None,
+                        help="Local tokenizer path used to count the prompt tokens, whitespace words by default.")
+    parser.add_argument("--max_hops", type=int, default=None,
+                        help="Maximal number of relations of a multi-hop reasoning path.")
+    parser.add_argument("--max_paths", type=int, default=None,
+                        help="Sample the reasoning path of a relation from its first max_paths valid paths only.")
+    args = parser.parse_args()
+
+    file_path = os.path.dirname(__file__)
+    project_path = os.path.abspath(os.path.join(file_path, ".."))
+    print(project_path)
+
+    dataset_name = "MAVEN_ERE"
+    data_path = os.path.join(project_path, f"data/MAVEN_ERE_split")
+    new_data_path = os.path.join(project_path, f"data/converted/{dataset_name}/joint")
+
+    if not os.path.exists(new_data_path):
+        os.makedirs(new_data_path)
+
+    partitioner = get_partitioner(args.max_length, args.tokenizer)
+    split_list = ["train", "valid", "test"]
+    for split in split_list:
+        convert_data(data_path, new_data_path, split, seed=args.seed, num_workers=args.num_workers,
+                     output_format=args.output_format, partitioner=partitioner, max_hops=args.max_hops,
+                     max_paths=args.max_paths)
+
+    print("finish")
@@ -1,182 +1,23 @@
+import argparse
 import os
 import json
-import copy
-import itertools
 import random
-import math
+from functools import partial
 from collections import defaultdict
-from tqdm import tqdm
 
-from constant import BIDIRECTIONAL_REL
-from template import TASK_DESC_TEMPORAL
+from constant import INVERSE_REL
+from document import filter_golden_events, choose_choices
+from compact import make_example
+from multi_target import convert_multi_target, get_relation_lines
+from engine import convert_documents
+from partition import EventNumPartitioner, get_partitioner
+from permutation import EventPermutation
+from writer import ExampleWriter
+from template import TASK_DESC_TEMPORAL, TASK_DESC_TEMPORAL_HALF
 
-
-class Document:
-    def __init__(self, data):
-        self.id = data["id"]
-        self.words = data["tokens"]
-        self.mentions = []
-        self.events = []
-        self.eid2mentions = {}
-
-        if "events" in data:
-            for e in data["events"]:
-                self.events += e["mention"]
-            for e in data["events"]:
-                self.eid2mentions[e["id"]] = e["mention"]
-        else:
-            self.events = copy.deepcopy(data['event_mentions'])
-
-        self.timexes = data["TIMEX"]
-        for t in data["TIMEX"]:
-            self.eid2mentions[t["id"]] = [t]
-        self.events_all = self.events + self.timexes
-
-        self.sort_events()
-        self.map_events()
-        self.map_timexes()
-
-        if "events" in data:
-            self.temporal_relations = data["temporal_relations"]
-            self.causal_relations = data["causal_relations"]
-            self.subevent_relations = {"subevent": data["subevent_relations"]}
-            self.coref_relations = None
-
-            self.temporal_labels = self.get_relation_labels(self.temporal_relations)
-            self.causal_labels = self.get_relation_labels(self.causal_relations)
-            self.subevent_labels = self.get_relation_labels(self.subevent_relations)
-            self.coref_labels = self.get_coref_labels(data)
-        else:
-            self.temporal_relations = {}
-            self.causal_relations = {}
-            self.subevent_relations = {}
-            self.coref_relations = {}
-
-        self.get_id2mention()
-
-        self.temporal_labels_dict = self.get_choices(self.temporal_labels)
-        self.causal_labels_dict = self.get_choices(self.causal_labels)
-        self.subevent_labels_dict = self.get_choices(self.subevent_labels)
-        self.coref_labels_dict = self.get_choices(self.coref_labels)
-
-    def sort_events(self):
-        self.events_all = sorted(self.events_all, key=lambda x: (x["sent_id"], x["offset"][0]))
-
-    def get_id2mention(self):
-        self.events_all_id2mention = {}
-        for index, event in enumerate(self.events_all):
-            if event["id"].startswith("TIME"):
-                mention = event["mention"]
-            else:
-                mention = event["trigger_word"]
-            self.events_all_id2mention[event["id"]] = mention
-
-    def map_events(self):
-        self.events_sorted = sorted(self.events, key=lambda x: (x["sent_id"], x["offset"][0]))
-        self.event_num2id = {f"e{index}": e["id"] for index, e in enumerate(self.events_sorted)}
-        self.event_id2num = {e["id"]: f"e{index}" for index, e in enumerate(self.events_sorted)}
-
-    def map_timexes(self):
-        self.timexes_sorted = sorted(self.timexes, key=lambda x: (x["sent_id"], x["offset"][0]))
-        self.timex_num2id = {f"t{index}": e["id"] for index, e in enumerate(self.timexes_sorted)}
-        self.timex_id2num = {e["id"]: f"t{index}" for index, e in enumerate(self.timexes_sorted)}
-
-    def get_relation_labels(self, relations):
-        new_relations = copy.deepcopy(relations)
-        for rel in relations:
-            pair_set = set()
-            for pair in relations[rel]:
-                for e1 in self.eid2mentions[pair[0]]:
-                    for e2 in self.eid2mentions[pair[1]]:
-                        if e1["id"].startswith("TIME"):
-                            e1_map_id = self.timex_id2num[e1["id"]]
-                        else:
-                            e1_map_id = self.event_id2num[e1["id"]]
-
-                        if e2["id"].startswith("TIME"):
-                            e2_map_id = self.timex_id2num[e2["id"]]
-                        else:
-                            e2_map_id = self.event_id2num[e2["id"]]
-
-                        pair_set.add((e1_map_id, e2_map_id))
-                        if rel in BIDIRECTIONAL_REL:
-                            pair_set.add((e2_map_id, e1_map_id))
-            new_relations[rel] = list(pair_set)
-
-        return new_relations
-
-    def get_coref_labels(self, data):
-        pair_list = []
-        for event in data["events"]:
-            for mention1, mention2 in itertools.permutations(event["mention"], 2):
-                # coref is bidirectional
-                m1_map_id = self.event_id2num[mention1["id"]]
-                m2_map_id = self.event_id2num[mention2["id"]]
-                pair_list.append((m1_map_id, m2_map_id))
-        relations = {"coreference": pair_list}
-
-        return relations
-
-    def get_choices(self, labels):
-        rel_choices = copy.deepcopy(labels)
-        for rel in labels.keys():
-            choices = {}
-            for pair in labels[rel]:
-                if pair[0] not in choices:
-                    choices[pair[0]] = [pair[1]]
-                else:
-                    choices[pair[0]].append(pair[1])
-
-            choices_sorted = copy.deepcopy(choices)
-            for key in choices:
-                choices_sorted[key] = sorted(choices[key], key=lambda x: int(x[1:]))
-
-            new_choices_sorted = {}
-            for key in choices_sorted:
-                for event in choices_sorted[key]:
-                    if event.startswith("t"):
-                        map_id = self.timex_num2id[event]
-                    else:
-                        map_id = self.event_num2id[event]
-
-                    mention = self.events_all_id2mention[map_id]
-                    if key not in new_choices_sorted:
-                        new_choices_sorted[key] = ["<" + event + " " + mention + ">"]
-                    else:
-                        new_choices_sorted[key].append("<" + event + " " + mention + ">")
-
-            rel_choices[rel] = new_choices_sorted
-        return rel_choices
-
-
-def filter_golden_events(doc, split_events_sorted):
-    tagged_events = []
-    for event in split_events_sorted:
-        event_id = event["id"]
-        if event_id.startswith("TIME"):
-            map_id = doc.timex_id2num[event_id]
-        else:
-            map_id = doc.event_id2num[event_id]
-        mention = doc.events_all_id2mention[event_id]
-        tagged_events.append("<" + map_id + " " + mention + ">")
-    return tagged_events
-
-
-def choose_choices(map_id, choices, tagged_events):
-    res = []
-    if map_id in choices.keys():
-        temp_res = choices[map_id]
-        for i in temp_res:
-            if i in tagged_events:
-                res.append(i)
-    else:
-        res = []
-
-    if len(res) > 0:
-        res_text = ", ".join(res)
-    else:
-        res_text = ", ".join(['none'])
-    return res_text, res
+NO_RELATION_TEXT = "SIMULTANEOUS: none; ENDS-ON: none; BEGINS-ON: none; " \
+                   "OVERLAP: none; CONTAINS: none; BEFORE: none"
+NO_RELATION_TEXT_HALF = NO_RELATION_TEXT + "; ENDED-ON-BY: none; OVERLAPPED-BY: none; CONTAINED-BY: none; AFTER: none"
 
 
 def map_triple2text(head_node, tail_node, relation_type):
@@ -240,17 +81,17 @@ def check_logic(relation1, relation2, golden_relation):
         return False
 
 
-def get_multi_hop_subgraph(map_id, mention, doc, tagged_events):
-    map_node = f"<{map_id} {mention}>"
+def get_multi_hop_subgraph(node, doc, tagged_events, rng):
+    map_node = node
 
     one_hop_nodes = []
     next_node_dict = {
-        "SIMULTANEOUS": choose_choices(map_id, doc.temporal_labels_dict['SIMULTANEOUS'], tagged_events)[1],
-        "ENDS-ON": choose_choices(map_id, doc.temporal_labels_dict['ENDS-ON'], tagged_events)[1],
-        "BEGINS-ON": choose_choices(map_id, doc.temporal_labels_dict['BEGINS-ON'], tagged_events)[1],
-        "OVERLAP": choose_choices(map_id, doc.temporal_labels_dict['OVERLAP'], tagged_events)[1],
-        "CONTAINS": choose_choices(map_id, doc.temporal_labels_dict['CONTAINS'], tagged_events)[1],
-        "BEFORE": choose_choices(map_id, doc.temporal_labels_dict['BEFORE'], tagged_events)[1],
+        "SIMULTANEOUS": choose_choices(doc, node, doc.temporal_labels_dict['SIMULTANEOUS'], tagged_events)[1],
+        "ENDS-ON": choose_choices(doc, node, doc.temporal_labels_dict['ENDS-ON'], tagged_events)[1],
+        "BEGINS-ON": choose_choices(doc, node, doc.temporal_labels_dict['BEGINS-ON'], tagged_events)[1],
+        "OVERLAP": choose_choices(doc, node, doc.temporal_labels_dict['OVERLAP'], tagged_events)[1],
+        "CONTAINS": choose_choices(doc, node, doc.temporal_labels_dict['CONTAINS'], tagged_events)[1],
+        "BEFORE": choose_choices(doc, node, doc.temporal_labels_dict['BEFORE'], tagged_events)[1],
     }
 
     one_hop_info = {}
@@ -262,15 +103,13 @@ def get_multi_hop_subgraph(map_id, mention, doc, tagged_events):
     nodes_path_info = defaultdict(list)
     multi_hop_text = []
     for head_node in list(one_hop_nodes):
-        head_node_id = head_node.split(" ")[0].lstrip("<")
-
         next_node_dict = {
-            "SIMULTANEOUS": choose_choices(head_node_id, doc.temporal_labels_dict['SIMULTANEOUS'], tagged_events)[1],
-            "ENDS-ON": choose_choices(head_node_id, doc.temporal_labels_dict['ENDS-ON'], tagged_events)[1],
-            "BEGINS-ON": choose_choices(head_node_id, doc.temporal_labels_dict['BEGINS-ON'], tagged_events)[1],
-            "OVERLAP": choose_choices(head_node_id, doc.temporal_labels_dict['OVERLAP'], tagged_events)[1],
-            "CONTAINS": choose_choices(head_node_id, doc.temporal_labels_dict['CONTAINS'], tagged_events)[1],
-            "BEFORE": choose_choices(head_node_id, doc.temporal_labels_dict['BEFORE'], tagged_events)[1],
+            "SIMULTANEOUS": choose_choices(doc, head_node, doc.temporal_labels_dict['SIMULTANEOUS'], tagged_events)[1],
+            "ENDS-ON": choose_choices(doc, head_node, doc.temporal_labels_dict['ENDS-ON'], tagged_events)[1],
+            "BEGINS-ON": choose_choices(doc, head_node, doc.temporal_labels_dict['BEGINS-ON'], tagged_events)[1],
+            "OVERLAP": choose_choices(doc, head_node, doc.temporal_labels_dict['OVERLAP'], tagged_events)[1],
+            "CONTAINS": choose_choices(doc, head_node, doc.temporal_labels_dict['CONTAINS'], tagged_events)[1],
+            "BEFORE": choose_choices(doc, head_node, doc.temporal_labels_dict['BEFORE'], tagged_events)[1],
         }
 
         for relation_type in next_node_dict.keys():
@@ -285,168 +124,205 @@ def get_multi_hop_subgraph(map_id, mention, doc, tagged_events):
 
     for head_node in list(one_hop_nodes):
         if head_node in nodes_path_info.keys():
-            current_path_info = random.sample(nodes_path_info[head_node], 1)[0]
-            multi_hop_text.append(
-                map_triple2text(current_path_info[1][0], current_path_info[1][1], current_path_info[1][2]))
+            current_path_info = rng.sample(nodes_path_info[head_node], 1)[0]
+            multi_hop_text.append(map_triple2text(doc.node_tags[current_path_info[1][0]],
+                                                  doc.node_tags[current_path_info[1][1]], current_path_info[1][2]))
 
     multi_hop_text = ", ".join(multi_hop_text)
     return multi_hop_text
 
 
-def get_coref_text(map_id, mention, doc, tagged_events):
-    head_node_id = map_id
-    head_node = f"<{map_id} {mention}>"
+def get_coref_text(node, doc, tagged_events):
+    head_node = doc.node_tags[node]
 
     next_node_dict = {
-        "coreference": choose_choices(head_node_id, doc.coref_labels_dict["coreference"], tagged_events)[1]
+        "coreference": choose_choices(doc, node, doc.coref_labels_dict["coreference"], tagged_events)[1]
     }
     relation_text = []
     for tail_node in next_node_dict["coreference"]:
-        relation_text.append(map_triple2text(head_node, tail_node, "coreference"))
+        relation_text.append(map_triple2text(head_node, doc.node_tags[tail_node], "coreference"))
     coref_text = ", ".join(relation_text)
 
     return coref_text
 
 
-def convert_data(data_path, new_data_path, split):
+def get_target_output(doc, node, tagged_events, half=False):
+    temporal_labels_list = [
+        f"SIMULTANEOUS: {choose_choices(doc, node, doc.temporal_labels_dict['SIMULTANEOUS'], tagged_events)[0]}",
+        f"ENDS-ON: {choose_choices(doc, node, doc.temporal_labels_dict['ENDS-ON'], tagged_events)[0]}",
+        f"BEGINS-ON: {choose_choices(doc, node, doc.temporal_labels_dict['BEGINS-ON'], tagged_events)[0]}",
+        f"OVERLAP: {choose_choices(doc, node, doc.temporal_labels_dict['OVERLAP'], tagged_events)[0]}",
+        f"CONTAINS: {choose_choices(doc, node, doc.temporal_labels_dict['CONTAINS'], tagged_events)[0]}",
+        f"BEFORE: {choose_choices(doc, node, doc.temporal_labels_dict['BEFORE'], tagged_events)[0]}"
+    ]
+    if half:
+        # the relations from the later events to the given event
+        temporal_labels_list += [
+            f"{INVERSE_REL[rel]}: "
+            f"{choose_choices(doc, node, doc.temporal_inverse_labels_dict[rel], tagged_events)[0]}"
+            for rel in ["ENDS-ON", "OVERLAP", "CONTAINS", "BEFORE"]
+        ]
+    relation_list = ["; ".join(temporal_labels_list)]
+
+    # Multi-hop subgraph
+    # multi_hop_text = get_multi_hop_subgraph(node, doc, tagged_events, rng)
+    coref_text = get_coref_text(node, doc, tagged_events)
+    if coref_text == "":
+        coref_info = "Coreference information: none"
+    else:
+        coref_info = f"Coreference information: {coref_text}"
+    # if multi_hop_text == "":
+    #     relevant_info = f"Relevant reasoning information: none"
+    # else:
+    #     relevant_info = f"Relevant reasoning information: {multi_hop_text}"
+
+    item_output = "\n\n".join(relation_list) + "\n" + coref_info
+    return item_output
+
+
+def convert_document(doc, rng, compact=False, partitioner=None, half=False, targets_per_prompt=1):
+    if partitioner is None:
+        partitioner = EventNumPartitioner()
+
+    permutation = EventPermutation(doc.events_all)
+    if targets_per_prompt > 1:
+        if half:
+            raise ValueError("The half prompts can not be combined with multi-target prompts.")
+        get_output = partial(get_target_output, doc)
+        return convert_multi_target(doc, rng, doc.events_all, permutation, TASK_DESC_TEMPORAL,
+                                    "have temporal relations", get_output, compact, partitioner, targets_per_prompt)
+
     examples = []
-    examples_pos, examples_neg = [], []
     doc_split_num = []
-    with open(os.path.join(data_path, f"{split}.jsonl")) as f:
-        lines = f.readlines()
 
-    for line in tqdm(lines):
-        data = json.loads(line.strip())
-        doc = Document(data)
+    for item in doc.events_all:
+        if item["id"].startswith("TIME"):
+            map_id = doc.timex_id2num[item["id"]]
+        else:
+            map_id = doc.event_id2num[item["id"]]
+        node = doc.id2node[item["id"]]
 
-        for item in doc.events_all:
-            if item["id"].startswith("TIME"):
-                map_id = doc.timex_id2num[item["id"]]
-            else:
-                map_id = doc.event_id2num[item["id"]]
-
-            # Document Partitioning Strategy
-            n = len(doc.events_all) - 1
-            if n == 0:
-                pass
-            k = 30
-            m = math.ceil(n / k) if n > 0 else 1
-            min_size = n // m
-            extra = n % m
-            sizes = [min_size + 1 if i < extra else min_size for i in range(m)]
-            doc_split_num.append(m)
-
-            new_events = copy.deepcopy(doc.events_all)
-            new_events.remove(item)
-            random.shuffle(new_events)
-
-            index = 0
-            for size in sizes:
-                split_events = new_events[index:index + size]
-                index += size
-                split_events.append(item)
-                split_events_sorted = sorted(split_events, key=lambda x: (x["sent_id"], x["offset"][0]))
-
-                new_sent_list = []
-                for sent_id, sent in enumerate(doc.words):
-                    new_sent = []
-                    offset = 0
-                    for event in split_events_sorted:
-                        if sent_id == event["sent_id"]:
-                            event_map = doc.timex_id2num[event["id"]] if event["id"].startswith("TIME") else \
-                                doc.event_id2num[event["id"]]
-                            sp1 = event["offset"][0]
-                            sp2 = event["offset"][1]
-                            # Events are marked with special symbols
-                            new_sent.extend(sent[offset: sp1])
-                            new_sent.extend(["<" + event_map])
-                            new_sent.extend([" ".join(sent[sp1: sp2]) + ">"])
-                            offset = sp2
-                    new_sent.extend(sent[offset:])
-                    new_sent_list.append(" ".join(new_sent))
-                text = " ".join(new_sent_list)
-
-                instruction = TASK_DESC_TEMPORAL
-                mention = doc.events_all_id2mention[item['id']]
-                sample_desc = f"Please identify the events in the document that have temporal relations " \
-                              f"with the given event <{map_id} {mention}>."
-
-                tagged_events = filter_golden_events(doc, split_events_sorted)
-                temporal_labels_list = [
-                    f"SIMULTANEOUS: {choose_choices(map_id, doc.temporal_labels_dict['SIMULTANEOUS'], tagged_events)[0]}",
-                    f"ENDS-ON: {choose_choices(map_id, doc.temporal_labels_dict['ENDS-ON'], tagged_events)[0]}",
-                    f"BEGINS-ON: {choose_choices(map_id, doc.temporal_labels_dict['BEGINS-ON'], tagged_events)[0]}",
-                    f"OVERLAP: {choose_choices(map_id, doc.temporal_labels_dict['OVERLAP'], tagged_events)[0]}",
-                    f"CONTAINS: {choose_choices(map_id, doc.temporal_labels_dict['CONTAINS'], tagged_events)[0]}",
-                    f"BEFORE: {choose_choices(map_id, doc.temporal_labels_dict['BEFORE'], tagged_events)[0]}"
-                ]
-                relation_list = ["; ".join(temporal_labels_list)]
-
-                # Multi-hop subgraph
-                # multi_hop_text = get_multi_hop_subgraph(map_id, mention, doc, tagged_events)
-                coref_text = get_coref_text(map_id, mention, doc, tagged_events)
-                if coref_text == "":
-                    coref_info = "Coreference information: none"
-                else:
-                    coref_info = f"Coreference information: {coref_text}"
-                # if multi_hop_text == "":
-                #     relevant_info = f"Relevant reasoning information: none"
-                # else:
-                #     relevant_info = f"Relevant reasoning information: {multi_hop_text}"
-
-                item_input = "Document content: " + text + "\n" + sample_desc
-                item_output = "\n\n".join(relation_list) + "\n" + coref_info
-                item_dict = {"instruction": instruction, "input": item_input, "output": item_output}
-
-                no_relation_text = "SIMULTANEOUS: none; ENDS-ON: none; BEGINS-ON: none; " \
-                                   "OVERLAP: none; CONTAINS: none; BEFORE: none"
-                if split == "train":
-                    if item_output.split("\n")[0] == no_relation_text:
-                        examples_neg.append(item_dict)
-                    else:
-                        examples_pos.append(item_dict)
-                else:
-                    examples.append(item_dict)
+        instruction = TASK_DESC_TEMPORAL_HALF if half else TASK_DESC_TEMPORAL
+        mention = doc.events_all_id2mention[item['id']]
+        sample_desc = f"Please identify the events in the document that have temporal relations " \
+                      f"with the given event <{map_id} {mention}>."
 
+        order = permutation.shuffle(item, rng, later_only=half)
+        if half and not order:
+            # the last event, all its pairs are asked from the earlier events
+            doc_split_num.append(0)
+            continue
+
+        # Document Partitioning Strategy
+        sizes = partitioner.get_sizes(doc, [item], permutation.get_events(order), instruction, sample_desc)
+        doc_split_num.append(len(sizes))
+
+        for split_events_sorted in permutation.split(item, order, sizes):
+
+            marks = doc.get_marks(split_events_sorted)
+
+            tagged_events = filter_golden_events(doc, split_events_sorted)
+            item_output = get_target_output(doc, node, tagged_events, half)
+            item_dict = make_example(doc, instruction, marks, sample_desc, item_output, compact)
+
+            examples.append(item_dict)
+
+    return examples, doc_split_num, None
+
+
+def is_negative(item_dict):
+    return all(line in [NO_RELATION_TEXT, NO_RELATION_TEXT_HALF] for line in get_relation_lines(item_dict["output"]))
+
+
+def finish_split(writer, doc_split_num, new_data_path, split, seed, doc_groups=None):
     if split == "train":
-        print(f"all_pos_num: {len(examples_pos)}")
-        print(f"all_neg_num: {len(examples_neg)}")
-        neg_num = int(len(examples_pos) / 4.0)
+        rng = random.Random(seed)
+        print(f"all_pos_num: {writer.num_pos}")
+        print(f"all_neg_num: {writer.num_neg}")
+        neg_num = int(writer.num_pos / 4.0)
         print(f"keep_neg_num: {neg_num}")
-        examples = examples_pos + random.sample(examples_neg, neg_num)
-        random.shuffle(examples)
-        keep_num = 100000
-        examples = examples[:keep_num]
-        print(f"keep_num: {len(examples)}")
+        keep_num = writer.sample(rng, neg_num, keep_num=100000)
+        print(f"keep_num: {keep_num}")
     else:
         file = os.path.join(new_data_path, f"{split}_doc_split_num.json")
         with open(file, "w") as f:
             json.dump(doc_split_num, f)
+        if doc_groups is not None:
+            # the target events of the multi-target prompts, one group per entry of doc_split_num
+            with open(os.path.join(new_data_path, f"{split}_doc_groups.json"), "w") as f:
+                json.dump(doc_groups, f)
 
-    new_data_file = os.path.join(new_data_path, f"{split}.json")
-    with open(new_data_file, 'w') as f:
-        json.dump(examples, f, indent=4, ensure_ascii=False)
+    writer.close()
     print(f"Convert {split} finish")
 
 
+def convert_data(data_path, new_data_path, split, seed=42, num_workers=1, output_format="json", partitioner=None,
+                 half=False, targets_per_prompt=1):
+    doc_split_num = []
+    doc_groups = [] if targets_per_prompt > 1 else None
+    writer = ExampleWriter(new_data_path, split, output_format, subsample=split == "train")
+    with open(os.path.join(data_path, f"{split}.jsonl")) as f:
+        lines = f.readlines()
+
+    convert_function = partial(convert_document, compact=output_format == "compact", partitioner=partitioner,
+                               half=half, targets_per_prompt=targets_per_prompt)
+    for results in convert_documents(lines, [convert_function], seed, num_workers):
+        doc_examples, doc_split_num_item, doc_groups_item = results[0]
+        doc_split_num.extend(doc_split_num_item)
+        if doc_groups is not None:
+            doc_groups.extend(doc_groups_item)
+        for item_dict in doc_examples:
+            writer.add(item_dict, negative=is_negative(item_dict))
+
+    finish_split(writer, doc_split_num, new_data_path, split, seed, doc_groups)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Seed of the per-document random state used for partitioning and sampling.")
+    parser.add_argument("--num_workers", type=int, default=1,
+                        help="Number of worker processes converting documents in parallel.")
+    parser.add_argument("--output_format", type=str, default="json", choices=["json", "jsonl", "compact"],
+                        help="Write one JSON array per split, stream one example per line into a JSONL file, "
+                             "or store every instruction and document body once in a {split}.compact.json file.")
+    parser.add_argument("--max_length", type=int, default=None,
+                        help="Pack the candidate events into prompts of at most max_length tokens "
+                             "instead of at most 30 candidate events per prompt.")
+    parser.add_argument("--tokenizer", type=str, default=None,
+                        help="Local tokenizer path used to count the prompt tokens, whitespace words by default.")
+    parser.add_argument("--half", action="store_true",
+                        help="Ask every pair of events only once from its earlier event, "
+                             "the relations from the later event are named by their inverse relations.")
+    parser.add_argument("--targets_per_prompt", type=int, default=1,
+                        help="Pack several consecutive target events into every prompt, written to temporal_multi.")
+    args = parser.parse_args()
+
     file_path = os.path.dirname(__file__)
     project_path = os.path.abspath(os.path.join(file_path, ".."))
     print(project_path)
-    random.seed(42)
 
     if not os.path.exists(os.path.join(project_path, "data/converted")):
         os.makedirs(os.path.join(project_path, "data/converted"))
 
     dataset_name = "MAVEN_ERE"
     data_path = os.path.join(project_path, f"data/MAVEN_ERE_split")
-    new_data_path = os.path.join(project_path, f"data/converted/{dataset_name}/temporal")
+    if args.half:
+        task_dir = "temporal_half"
+    elif args.targets_per_prompt > 1:
+        task_dir = "temporal_multi"
+    else:
+        task_dir = "temporal"
+    new_data_path = os.path.join(project_path, f"data/converted/{dataset_name}/{task_dir}")
 
     if not os.path.exists(new_data_path):
         os.makedirs(new_data_path)
 
+    partitioner = get_partitioner(args.max_length, args.tokenizer)
     split_list = ["train", "valid", "test"]
     for split in split_list:
-        convert_data(data_path, new_data_path, split)
+        convert_data(data_path, new_data_path, split, seed=args.seed, num_workers=args.num_workers,
+                     output_format=args.output_format, partitioner=partitioner, half=args.half,
+                     targets_per_prompt=args.targets_per_prompt)
 
     print("finish")
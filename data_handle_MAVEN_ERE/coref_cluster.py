@@ -0,0 +1,181 @@
+import argparse
+import os
+import json
+
+from document import Document
+from engine import get_doc_rng
+from partition import EventNumPartitioner, get_partitioner
+from permutation import EventPermutation
+from prediction_parser import PredictionParser
+from convert_coref import get_target_examples
+from union_find import ConfirmedClusters
+
+
+class CorefClusterPrompter:
+    """
+    ask the coreference prompts of a document target by target, a target named by an asked target of a confirmed
+    predicted cluster is absorbed and skipped, see ConfirmedClusters; the answers are transitive, an absorbed target
+    would mostly repeat its cluster. an asked target gets the same prompts as in convert_coref.convert_document
+    """
+
+    def __init__(self, doc, rng, compact=False, partitioner=None):
+        self.doc = doc
+        self.rng = rng
+        self.compact = compact
+        self.partitioner = EventNumPartitioner() if partitioner is None else partitioner
+        self.permutation = EventPermutation(doc.events_sorted)
+        self.targets = [item for item in doc.events_all if not item["id"].startswith("TIME")]
+        # the clusters of the predictions so far
+        self.clusters = ConfirmedClusters(range(len(doc.node_tags)))
+        # the answers are read like in eval_coref.evaluate_document, so the evaluation skips the same targets
+        self.parser = PredictionParser(", ")
+        self.index = 0
+        self.node = None
+        self.doc_split_num = []
+        self.examples = []
+        self.predictions = []
+
+    def next_examples(self):
+        """
+        the prompts of the next target that is not absorbed yet, None if all targets are done
+        """
+        while self.index < len(self.targets):
+            item = self.targets[self.index]
+            self.index += 1
+            # the random draws of the skipped targets are kept, the prompts do not depend on the predictions
+            order = self.permutation.shuffle(item, self.rng)
+            node = self.doc.id2node[item["id"]]
+            if self.clusters.absorb(node):
+                self.doc_split_num.append(0)
+                continue
+            self.clusters.ask(node)
+
+            examples = get_target_examples(self.doc, item, self.permutation, order, self.partitioner, self.compact)
+            self.doc_split_num.append(len(examples))
+            self.node = node
+            return examples
+        return None
+
+    def add_predictions(self, examples, predictions):
+        """
+        merge the target of the last prompts with the events predicted as coreferent, the unknown events and the
+        timexes are ignored like in the evaluation
+        """
+        for predict in predictions:
+            for map_id in self.parser.parse_text(predict["predict"]).get("COREFERENCE", []):
+                if map_id in self.doc.event_num2id:
+                    self.clusters.add_link(self.node, self.doc.id2node[self.doc.event_num2id[map_id]])
+        self.examples.extend(examples)
+        self.predictions.extend(predictions)
+
+
+def convert_iterative(lines, generate, seed=42, compact=False, partitioner=None):
+    """
+    ask the targets of all documents in rounds, every round holds the next target of every unfinished document;
+    generate(examples) returns the prediction dicts {"predict": text} of the examples, e.g. by a batched model call.
+    returns the asked examples and predictions in the document order and doc_split_num with 0 for the skipped targets
+    """
+    prompters = []
+    for line in lines:
+        doc = Document(json.loads(line.strip()))
+        prompters.append(CorefClusterPrompter(doc, get_doc_rng(seed, doc.id), compact, partitioner))
+
+    active = prompters
+    num_rounds = 0
+    while active:
+        requests = [(prompter, prompter.next_examples()) for prompter in active]
+        requests = [(prompter, examples) for prompter, examples in requests if examples is not None]
+        if not requests:
+            break
+        num_rounds += 1
+        predictions = generate([item_dict for _, examples in requests for item_dict in examples])
+        index = 0
+        for prompter, examples in requests:
+            prompter.add_predictions(examples, predictions[index:index + len(examples)])
+            index += len(examples)
+        active = [prompter for prompter, _ in requests]
+    print(f"rounds: {num_rounds}")
+
+    examples, predictions, doc_split_num = [], [], []
+    for prompter in prompters:
+        examples.extend(prompter.examples)
+        predictions.extend(prompter.predictions)
+        doc_split_num.extend(prompter.doc_split_num)
+    return examples, predictions, doc_split_num
+
+
+class ReplayGenerator:
+    """
+    answer the prompts with the predictions of the per-mention prompts converted by convert_coref.py,
+    the prompts are looked up by their text
+    """
+
+    def __init__(self, examples, predictions):
+        self.answers = {(item_dict["instruction"], item_dict["input"]): predict
+                        for item_dict, predict in zip(examples, predictions)}
+
+    def __call__(self, examples):
+        predictions = []
+        for item_dict in examples:
+            key = (item_dict["instruction"], item_dict["input"])
+            if key not in self.answers:
+                raise ValueError("The prompt is not in the per-mention prompts, please convert them with the same "
+                                 "seed and partitioning.")
+            predictions.append(self.answers[key])
+        return predictions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cluster-level coreference prompting: a target named by an asked target of a confirmed cluster "
+                    "is absorbed without its own prompts. It saves the prompts of the absorbed targets, their "
+                    "membership rests on one answer instead of a mutual link, so the scores of eval_coref.py "
+                    "--iterative are not comparable with the per-mention coreference scores.")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Seed of the per-document random state used for partitioning, the same as of the "
+                             "per-mention prompts.")
+    parser.add_argument("--max_length", type=int, default=None,
+                        help="Pack the candidate events into prompts of at most max_length tokens "
+                             "instead of at most 30 candidate events per prompt.")
+    parser.add_argument("--tokenizer", type=str, default=None,
+                        help="Local tokenizer path used to count the prompt tokens, whitespace words by default.")
+    parser.add_argument("--replay_version", type=str, default="MAVEN_ERE_coref",
+                        help="Replay the iterative prompting offline with the predict results of the per-mention "
+                             "test prompts, written to {replay_version}_iterative.")
+    args = parser.parse_args()
+
+    file_path = os.path.dirname(__file__)
+    project_path = os.path.abspath(os.path.join(file_path, ".."))
+    print(project_path)
+
+    dataset_name = "MAVEN_ERE"
+    data_path = os.path.join(project_path, f"data/MAVEN_ERE_split")
+    new_data_path = os.path.join(project_path, f"data/converted/{dataset_name}/coref_iterative")
+    predict_path = os.path.join(project_path, "output/predict", f"{args.replay_version}_iterative")
+    for path in [new_data_path, predict_path]:
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    with open(os.path.join(project_path, f"data/converted/{dataset_name}/coref/test.json")) as f:
+        replay_examples = json.load(f)
+    with open(os.path.join(project_path, "output/predict", args.replay_version, "generated_predictions.jsonl"),
+              encoding="utf-8") as f:
+        replay_predictions = [json.loads(line) for line in f]
+    generate = ReplayGenerator(replay_examples, replay_predictions)
+
+    with open(os.path.join(data_path, "test.jsonl")) as f:
+        lines = f.readlines()
+    partitioner = get_partitioner(args.max_length, args.tokenizer)
+    examples, predictions, doc_split_num = convert_iterative(lines, generate, args.seed, partitioner=partitioner)
+    print(f"asked prompts: {len(examples)}/{len(replay_examples)}, the absorbed targets are clustered by one "
+          f"answer instead of a mutual link")
+
+    with open(os.path.join(new_data_path, "test.json"), "w") as f:
+        json.dump(examples, f, indent=4, ensure_ascii=False)
+    with open(os.path.join(new_data_path, "test_doc_split_num.json"), "w") as f:
+        json.dump(doc_split_num, f)
+    with open(os.path.join(predict_path, "generated_predictions.jsonl"), "w", encoding="utf-8") as f:
+        for predict in predictions:
+            f.write(json.dumps(predict, ensure_ascii=False) + "\n")
+
+    print("finish")
@@ -0,0 +1,261 @@
+import copy
+import itertools
+from array import array
+from functools import cached_property
+
+from constant import BIDIRECTIONAL_REL
+from render import DocumentRenderer
+
+
+class Document:
+    """
+    MAVEN-ERE document shared by all converters, the relation labels of each task are built on first access
+    """
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.words = data["tokens"]
+        self.mentions = []
+        self.events = []
+        self.eid2mentions = {}
+
+        if "events" in data:
+            for e in data["events"]:
+                self.events += e["mention"]
+            for e in data["events"]:
+                self.eid2mentions[e["id"]] = e["mention"]
+        else:
+            self.events = copy.deepcopy(data['event_mentions'])
+
+        self.timexes = data["TIMEX"]
+        for t in data["TIMEX"]:
+            self.eid2mentions[t["id"]] = [t]
+        self.events_all = self.events + self.timexes
+
+        self.sort_events()
+        self.map_events()
+        self.map_timexes()
+
+        if "events" in data:
+            self.coref_events = data["events"]
+            self.temporal_relations = data["temporal_relations"]
+            self.causal_relations = data["causal_relations"]
+            self.subevent_relations = {"subevent": data["subevent_relations"]}
+            self.coref_relations = None
+        else:
+            self.coref_events = None
+            self.temporal_relations = {}
+            self.causal_relations = {}
+            self.subevent_relations = {}
+            self.coref_relations = {}
+
+        self.get_id2mention()
+        self.map_nodes()
+
+    @cached_property
+    def renderer(self):
+        return DocumentRenderer(self.words)
+
+    @cached_property
+    def body(self):
+        return {"id": self.id, "sentences": self.words}
+
+    @cached_property
+    def temporal_labels(self):
+        return self.get_relation_labels(self.temporal_relations)
+
+    @cached_property
+    def causal_labels(self):
+        return self.get_relation_labels(self.causal_relations)
+
+    @cached_property
+    def subevent_labels(self):
+        return self.get_relation_labels(self.subevent_relations)
+
+    @cached_property
+    def coref_labels(self):
+        if self.coref_events is None:
+            return {}
+        return self.get_coref_labels(self.coref_events)
+
+    @cached_property
+    def temporal_labels_dict(self):
+        return self.get_choices(self.temporal_labels)
+
+    @cached_property
+    def causal_labels_dict(self):
+        return self.get_choices(self.causal_labels)
+
+    @cached_property
+    def subevent_labels_dict(self):
+        return self.get_choices(self.subevent_labels)
+
+    @cached_property
+    def coref_labels_dict(self):
+        return self.get_choices(self.coref_labels)
+
+    @cached_property
+    def temporal_inverse_labels_dict(self):
+        return self.get_choices(self.get_inverse_labels(self.temporal_labels))
+
+    @cached_property
+    def subevent_inverse_labels_dict(self):
+        return self.get_choices(self.get_inverse_labels(self.subevent_labels))
+
+    @cached_property
+    def causal_graph(self):
+        relation_indexes = [(rel, self.causal_labels_dict[rel]) for rel in ["CAUSE", "PRECONDITION"]]
+        return RelationGraph(len(self.node_tags), relation_indexes)
+
+    @cached_property
+    def subevent_graph(self):
+        return RelationGraph(len(self.node_tags), [("SUBEVENT", self.subevent_labels_dict["subevent"])])
+
+    def sort_events(self):
+        self.events_all = sorted(self.events_all, key=lambda x: (x["sent_id"], x["offset"][0]))
+
+    def get_id2mention(self):
+        self.events_all_id2mention = {}
+        for index, event in enumerate(self.events_all):
+            if event["id"].startswith("TIME"):
+                mention = event["mention"]
+            else:
+                mention = event["trigger_word"]
+            self.events_all_id2mention[event["id"]] = mention
+
+    def map_events(self):
+        self.events_sorted = sorted(self.events, key=lambda x: (x["sent_id"], x["offset"][0]))
+        self.event_num2id = {f"e{index}": e["id"] for index, e in enumerate(self.events_sorted)}
+        self.event_id2num = {e["id"]: f"e{index}" for index, e in enumerate(self.events_sorted)}
+
+    def map_timexes(self):
+        self.timexes_sorted = sorted(self.timexes, key=lambda x: (x["sent_id"], x["offset"][0]))
+        self.timex_num2id = {f"t{index}": e["id"] for index, e in enumerate(self.timexes_sorted)}
+        self.timex_id2num = {e["id"]: f"t{index}" for index, e in enumerate(self.timexes_sorted)}
+
+    def map_nodes(self):
+        # nodes are ordered like the sorted choices: by index, events before timexes with the same index
+        map_ids = [f"e{index}" for index in range(len(self.events_sorted))]
+        map_ids += [f"t{index}" for index in range(len(self.timexes_sorted))]
+        self.node2map_id = sorted(map_ids, key=lambda x: (int(x[1:]), x[0]))
+        self.map_id2node = {map_id: node for node, map_id in enumerate(self.node2map_id)}
+        self.id2node = {}
+        self.node_tags = []
+        for map_id in self.node2map_id:
+            event_id = self.timex_num2id[map_id] if map_id.startswith("t") else self.event_num2id[map_id]
+            self.id2node[event_id] = len(self.node_tags)
+            self.node_tags.append("<" + map_id + " " + self.events_all_id2mention[event_id] + ">")
+
+    def get_marks(self, split_events_sorted):
+        return [(event["sent_id"], event["offset"][0], event["offset"][1], self.node2map_id[self.id2node[event["id"]]])
+                for event in split_events_sorted]
+
+    def get_relation_labels(self, relations):
+        new_relations = {}
+        for rel in relations:
+            pair_set = set()
+            for pair in relations[rel]:
+                for e1 in self.eid2mentions[pair[0]]:
+                    for e2 in self.eid2mentions[pair[1]]:
+                        e1_node = self.id2node[e1["id"]]
+                        e2_node = self.id2node[e2["id"]]
+                        pair_set.add((e1_node, e2_node))
+                        if rel in BIDIRECTIONAL_REL:
+                            pair_set.add((e2_node, e1_node))
+            new_relations[rel] = pair_set
+
+        return new_relations
+
+    def get_coref_labels(self, events):
+        pair_set = set()
+        for event in events:
+            for mention1, mention2 in itertools.permutations(event["mention"], 2):
+                # coref is bidirectional
+                pair_set.add((self.id2node[mention1["id"]], self.id2node[mention2["id"]]))
+        relations = {"coreference": pair_set}
+
+        return relations
+
+    def get_inverse_labels(self, labels):
+        # the (tail, head) pairs of every relation, the targets of the half prompts are the tails
+        return {rel: {(tail, head) for head, tail in labels[rel]} for rel in labels}
+
+    def get_choices(self, labels):
+        return {rel: RelationIndex(len(self.node_tags), labels[rel]) for rel in labels}
+
+
+class RelationIndex:
+    """
+    CSR adjacency of one relation type, the tails of every head node are sorted
+    """
+
+    def __init__(self, num_nodes, pairs):
+        pairs = sorted(pairs)
+        self.indptr = array("i", [0] * (num_nodes + 1))
+        for head, _ in pairs:
+            self.indptr[head + 1] += 1
+        for node in range(num_nodes):
+            self.indptr[node + 1] += self.indptr[node]
+        self.indices = array("i", [tail for _, tail in pairs])
+
+    def tails(self, head):
+        return self.indices[self.indptr[head]:self.indptr[head + 1]]
+
+
+class RelationGraph:
+    """
+    relation graph of one document, built once and shared by all partitions;
+    a later relation type overrides the type of an edge but keeps its position among the successors
+    """
+
+    def __init__(self, num_nodes, relation_indexes):
+        self.successors = [{} for _ in range(num_nodes)]
+        for relation_type, relation_index in relation_indexes:
+            for head in range(num_nodes):
+                for tail in relation_index.tails(head):
+                    self.successors[head][tail] = relation_type
+        self.predecessors = [[] for _ in range(num_nodes)]
+        for head, tails in enumerate(self.successors):
+            for tail in tails:
+                self.predecessors[tail].append(head)
+
+    def restrict(self, tagged_events):
+        return RelationGraphView(self, tagged_events)
+
+
+class RelationGraphView:
+    """
+    the relation graph among the events tagged in one partition, tagged_events is the membership bitmap
+    """
+
+    def __init__(self, graph, tagged_events):
+        self.graph = graph
+        self.tagged_events = tagged_events
+        self.successors_cache = {}
+
+    def successors(self, node):
+        if node not in self.successors_cache:
+            self.successors_cache[node] = {tail: relation_type for tail, relation_type
+                                           in self.graph.successors[node].items() if self.tagged_events[tail]}
+        return self.successors_cache[node]
+
+    def predecessors(self, node):
+        return [head for head in self.graph.predecessors[node] if self.tagged_events[head]]
+
+
+def filter_golden_events(doc, split_events_sorted):
+    """
+    membership bitmap of the events tagged in one partition, shared by the lookups of all relation types
+    """
+    tagged_events = bytearray(len(doc.node_tags))
+    for event in split_events_sorted:
+        tagged_events[doc.id2node[event["id"]]] = 1
+    return tagged_events
+
+
+def choose_choices(doc, node, choices, tagged_events):
+    indptr = choices.indptr
+    res = [tail for tail in choices.indices[indptr[node]:indptr[node + 1]] if tagged_events[tail]]
+    if len(res) > 0:
+        return ", ".join([doc.node_tags[tail] for tail in res]), res
+    return "none", res
@@ -0,0 +1,35 @@
+import json
+import random
+from functools import partial
+from multiprocessing import Pool
+from tqdm import tqdm
+
+from document import Document
+
+
+def get_doc_rng(seed, doc_id):
+    """
+    per-document random state, independent of which worker converts the document
+    """
+    return random.Random(f"{seed}-{doc_id}")
+
+
+def convert_line(convert_functions, seed, line):
+    # the document is parsed once and shared by all tasks, each task gets its own random state
+    doc = Document(json.loads(line.strip()))
+    return [convert_document(doc, get_doc_rng(seed, doc.id)) for convert_document in convert_functions]
+
+
+def convert_documents(lines, convert_functions, seed=42, num_workers=1, chunksize=8):
+    """
+    yield [convert_document(doc, rng) for convert_document in convert_functions] for every line,
+    in the original document order
+    """
+    worker = partial(convert_line, convert_functions, seed)
+    if num_workers <= 1:
+        for line in tqdm(lines):
+            yield worker(line)
+    else:
+        with Pool(num_workers) as pool:
+            for result in tqdm(pool.imap(worker, lines, chunksize=chunksize), total=len(lines)):
+                yield result
@@ -1,9 +1,17 @@
+import argparse
 import os
 import json
 import random
 
+from compact import load_compact, merge_datasets, dump_compact
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_format", type=str, default="json", choices=["json", "compact"],
+                        help="Merge the {split}.json files, or the {split}.compact.json files of the tasks.")
+    args = parser.parse_args()
+
     file_path = os.path.dirname(__file__)
     project_path = os.path.abspath(os.path.join(file_path, ".."))
     print(project_path)
@@ -16,24 +24,32 @@ if __name__ == "__main__":
     if not os.path.exists(merge_data_path):
         os.makedirs(merge_data_path)
 
-    with open(os.path.join(origin_data_path, f"temporal/train.json")) as f:
-        data_temporal = json.load(f)
-    with open(os.path.join(origin_data_path, f"causal/train.json")) as f:
-        data_causal = json.load(f)
-    with open(os.path.join(origin_data_path, f"subevent/train.json")) as f:
-        data_subevent = json.load(f)
-    with open(os.path.join(origin_data_path, f"coref/train.json")) as f:
-        data_coref = json.load(f)
-
     expansion_ratio = 2
-    examples = []
-    examples += data_temporal
-    examples += data_causal
-    examples += data_subevent * expansion_ratio
-    examples += data_coref
-
-    random.shuffle(examples)
-    with open(os.path.join(merge_data_path, "train.json"), 'w') as f:
-        json.dump(examples, f, indent=4, ensure_ascii=False)
+    if args.input_format == "compact":
+        # the examples keep referring to the shared instructions and document bodies of the tasks
+        datasets = [load_compact(os.path.join(origin_data_path, f"{task}/train.compact.json"))
+                    for task in ["temporal", "causal", "subevent", "coref"]]
+        merged = merge_datasets(datasets[:2] + [datasets[2]] * expansion_ratio + datasets[3:])
+        random.shuffle(merged["examples"])
+        dump_compact(merged, os.path.join(merge_data_path, "train.compact.json"))
+    else:
+        with open(os.path.join(origin_data_path, f"temporal/train.json")) as f:
+            data_temporal = json.load(f)
+        with open(os.path.join(origin_data_path, f"causal/train.json")) as f:
+            data_causal = json.load(f)
+        with open(os.path.join(origin_data_path, f"subevent/train.json")) as f:
+            data_subevent = json.load(f)
+        with open(os.path.join(origin_data_path, f"coref/train.json")) as f:
+            data_coref = json.load(f)
+
+        examples = []
+        examples += data_temporal
+        examples += data_causal
+        examples += data_subevent * expansion_ratio
+        examples += data_coref
+
+        random.shuffle(examples)
+        with open(os.path.join(merge_data_path, "train.json"), 'w') as f:
+            json.dump(examples, f, indent=4, ensure_ascii=False)
 
     print("finish")
@@ -0,0 +1,57 @@
+from document import filter_golden_events
+from compact import make_example
+from partition import EventNumPartitioner
+from template import MULTI_TARGET_DESC
+
+
+def convert_multi_target(doc, rng, targets, permutation, instruction, relation_desc, get_output, compact=False,
+                         partitioner=None, targets_per_prompt=4):
+    """
+    pack targets_per_prompt consecutive targets into every prompt, they are tagged in all prompts of their group
+    and asked against the same shuffled partitions of the other events; the output holds one answer block per
+    target, "<e3 trigger>: " followed by get_output(node, tagged_events) of the target
+    """
+    if partitioner is None:
+        partitioner = EventNumPartitioner()
+
+    examples = []
+    doc_split_num = []
+    doc_groups = []
+
+    instruction = instruction + MULTI_TARGET_DESC
+    for index in range(0, len(targets), targets_per_prompt):
+        group = targets[index:index + targets_per_prompt]
+        nodes = [doc.id2node[item["id"]] for item in group]
+        sample_desc = f"Please identify the events in the document that {relation_desc} with each of the given " \
+                      f"events {', '.join(doc.node_tags[node] for node in nodes)}."
+
+        order = permutation.shuffle_group(group, rng)
+
+        # Document Partitioning Strategy
+        sizes = partitioner.get_sizes(doc, group, permutation.get_events(order), instruction, sample_desc)
+        doc_split_num.append(len(sizes))
+        doc_groups.append([doc.node2map_id[node] for node in nodes])
+
+        for split_events_sorted in permutation.split_group(group, order, sizes):
+            marks = doc.get_marks(split_events_sorted)
+
+            tagged_events = filter_golden_events(doc, split_events_sorted)
+            item_output = "\n\n".join(f"{doc.node_tags[node]}: {get_output(node, tagged_events)}" for node in nodes)
+            item_dict = make_example(doc, instruction, marks, sample_desc, item_output, compact)
+
+            examples.append(item_dict)
+
+    return examples, doc_split_num, doc_groups
+
+
+def get_relation_lines(output):
+    """
+    the relation line of every answer block of an output, without the given event heading a multi-target block
+    """
+    relation_lines = []
+    for block in output.split("\n\n"):
+        line = block.split("\n", 1)[0]
+        if line.startswith("<"):
+            line = line.partition(">: ")[2]
+        relation_lines.append(line)
+    return relation_lines
@@ -0,0 +1,87 @@
+import math
+
+from compact import INPUT_PREFIX
+
+
+class EventNumPartitioner:
+    """
+    the fixed partitioning strategy: at most k candidate events per prompt, the chunk sizes differ by at most one
+    """
+
+    def __init__(self, k=30):
+        self.k = k
+
+    def get_sizes(self, doc, items, new_events, instruction, sample_desc):
+        n = len(new_events)
+        m = math.ceil(n / self.k) if n > 0 else 1
+        min_size = n // m
+        extra = n % m
+        return [min_size + 1 if i < extra else min_size for i in range(m)]
+
+
+class TokenBudgetPartitioner:
+    """
+    pack the shuffled candidate events in order into prompts of at most max_length tokens,
+    a prompt always holds at least one candidate event even if it exceeds the budget
+    """
+
+    def __init__(self, max_length, length_estimator, k=None):
+        self.max_length = max_length
+        self.length_estimator = length_estimator
+        self.k = k
+        self.doc_id = None
+
+    def index_document(self, doc):
+        # the whole document is in every prompt, marking an event only adds the tokens of its tag
+        self.doc_id = doc.id
+        self.doc_length = self.length_estimator(INPUT_PREFIX + " ".join(doc.renderer.plain_sentences))
+        self.node_costs = []
+        for node, map_id in enumerate(doc.node2map_id):
+            event_id = doc.timex_num2id[map_id] if map_id.startswith("t") else doc.event_num2id[map_id]
+            mention = doc.events_all_id2mention[event_id]
+            cost = self.length_estimator(doc.node_tags[node]) - self.length_estimator(mention)
+            self.node_costs.append(max(cost, 0))
+
+    def get_sizes(self, doc, items, new_events, instruction, sample_desc):
+        # items: the target events tagged in every prompt
+        if self.doc_id != doc.id:
+            self.index_document(doc)
+        length = self.length_estimator(instruction) + self.doc_length + self.length_estimator(sample_desc)
+        length += sum(self.node_costs[doc.id2node[item["id"]]] for item in items)
+        capacity = self.max_length - length
+
+        sizes = []
+        size, chunk_length = 0, 0
+        for event in new_events:
+            cost = self.node_costs[doc.id2node[event["id"]]]
+            if size > 0 and (chunk_length + cost > capacity or size == self.k):
+                sizes.append(size)
+                size, chunk_length = 0, 0
+            size += 1
+            chunk_length += cost
+        sizes.append(size)
+        return sizes
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class TokenizerLengthEstimator:
+    """
+    number of tokens of a local HuggingFace tokenizer, transformers is only needed when it is used
+    """
+
+    def __init__(self, tokenizer_path):
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+
+    def __call__(self, text):
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def get_partitioner(max_length=None, tokenizer_path=None, k=30):
+    if max_length is None:
+        return EventNumPartitioner(k)
+    length_estimator = count_words if tokenizer_path is None else TokenizerLengthEstimator(tokenizer_path)
+    return TokenBudgetPartitioner(max_length, length_estimator)
@@ -0,0 +1,74 @@
+import collections
+
+
+def get_reachable(graph, target):
+    # nodes with a directed path to the target, the other nodes can never complete a path
+    reachable = {target}
+    queue = collections.deque([target])
+    while queue:
+        node = queue.popleft()
+        for head in graph.predecessors(node):
+            if head not in reachable:
+                reachable.add(head)
+                queue.append(head)
+    return reachable
+
+
+class PathMiner:
+    """
+    search the multi-hop paths from a source to one of its direct successors, in the order of
+    nx.all_simple_paths; a path is kept if the composition of its relations equals the relation of the direct edge,
+    and pruned as soon as infer_relation returns None
+    """
+
+    def __init__(self, infer_relation, max_hops=None, max_paths=None):
+        # max_hops: the maximal number of edges of a path, max_paths: stop after the first max_paths valid paths
+        self.infer_relation = infer_relation
+        self.max_hops = max_hops
+        self.max_paths = max_paths
+
+    def mine(self, graph, source, target):
+        """
+        graph.successors(node) gives the ordered {tail: relation_type} of a node, graph.predecessors(node) its heads
+        """
+        if source == target or target not in graph.successors(source):
+            return []
+        direct_relation = graph.successors(source)[target]
+        reachable = get_reachable(graph, target)
+
+        right_paths = []
+        path, path_set, relations = [source], {source}, [None]
+        stack = [iter(graph.successors(source).items())]
+        while stack:
+            for node, edge_relation in stack[-1]:
+                if node in path_set:
+                    continue
+                # number of edges of the path once it is extended to node
+                hops = len(path)
+                if relations[-1] is None:
+                    relation = edge_relation
+                else:
+                    relation = self.infer_relation(relations[-1], edge_relation)
+                if relation is None:
+                    continue
+
+                if node == target:
+                    if 1 < hops and (self.max_hops is None or hops <= self.max_hops) and relation == direct_relation:
+                        right_paths.append(path + [node])
+                        if self.max_paths is not None and len(right_paths) >= self.max_paths:
+                            return right_paths
+                    continue
+                if node not in reachable or (self.max_hops is not None and hops >= self.max_hops):
+                    continue
+
+                path.append(node)
+                path_set.add(node)
+                relations.append(relation)
+                stack.append(iter(graph.successors(node).items()))
+                break
+            else:
+                stack.pop()
+                path_set.discard(path.pop())
+                relations.pop()
+
+        return right_paths
@@ -0,0 +1,57 @@
+class EventPermutation:
+    """
+    the candidate events of a target as integer positions into an event array sorted by (sent_id, offset),
+    shuffling and sorting the positions gives the same partitions as shuffling and re-sorting a copy of the array
+    """
+
+    def __init__(self, events_sorted):
+        self.events = events_sorted
+        self.position = {event["id"]: index for index, event in enumerate(events_sorted)}
+        # events with the same (sent_id, offset) share a rank, the stable sort by rank keeps them in the order
+        # of the chunk like the stable sort by the key
+        self.ranks = []
+        for index, event in enumerate(events_sorted):
+            if index > 0 and (event["sent_id"], event["offset"][0]) == (events_sorted[index - 1]["sent_id"],
+                                                                         events_sorted[index - 1]["offset"][0]):
+                self.ranks.append(self.ranks[-1])
+            else:
+                self.ranks.append(index)
+
+    def shuffle(self, item, rng, later_only=False):
+        """
+        the positions of the events except item in random order, rng.shuffle only depends on the length of the list;
+        later_only keeps the events after item only, every pair is then asked once from its earlier event
+        """
+        target = self.position[item["id"]]
+        order = list(range(target + 1, len(self.events)))
+        if not later_only:
+            order = list(range(target)) + order
+        rng.shuffle(order)
+        return order
+
+    def shuffle_group(self, items, rng):
+        """
+        the positions of the events except the target events of a multi-target prompt in random order
+        """
+        targets = {self.position[item["id"]] for item in items}
+        order = [index for index in range(len(self.events)) if index not in targets]
+        rng.shuffle(order)
+        return order
+
+    def get_events(self, positions):
+        return [self.events[index] for index in positions]
+
+    def split(self, item, order, sizes):
+        """
+        yield the events of every chunk of the shuffled order together with item, sorted by (sent_id, offset)
+        """
+        return self.split_group([item], order, sizes)
+
+    def split_group(self, items, order, sizes):
+        targets = [self.position[item["id"]] for item in items]
+        index = 0
+        for size in sizes:
+            positions = order[index:index + size] + targets
+            index += size
+            positions.sort(key=self.ranks.__getitem__)
+            yield self.get_events(positions)
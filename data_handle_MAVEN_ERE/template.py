@@ -32,3 +32,47 @@ TASK_DESC_COREF = "The current task is an event coreference relation extraction
                   "have a coreference relation with the given event. The prescribed output format should follow this " \
                   "structure: 'relation1: event1, event2; relation2: event3, event4'. The output 'relation: none' " \
                   "indicates that the given event lacks this particular type of relation with other events."
+
+TASK_DESC_TEMPORAL_HALF = "The current task is an event temporal relation extraction task, which aims to identify " \
+                          "temporal relations among events in texts. The temporal relation between events refers to " \
+                          "the chronological order in which they occur, involving six subtypes, namely, " \
+                          "SIMULTANEOUS, ENDS-ON, BEGINS-ON, OVERLAP, CONTAINS, and BEFORE. The inverse subtypes " \
+                          "ENDED-ON-BY, OVERLAPPED-BY, CONTAINED-BY, and AFTER denote that the other event has the " \
+                          "subtype ENDS-ON, OVERLAP, CONTAINS, or BEFORE with the given event. In the provided " \
+                          "document, event trigger words are annotated within angle brackets (<>), only the events " \
+                          "after the given event are annotated. The desired outcome is a list of events in the " \
+                          "document that have temporal relations with the given event. The prescribed output format " \
+                          "should follow this structure: 'relation1: event1, event2; relation2: event3, event4'. The " \
+                          "output 'relation: none' indicates that the given event lacks this particular type of " \
+                          "relation with other events."
+
+TASK_DESC_SUBEVENT_HALF = "The current task is a subevent relation extraction task, which aims to identify subevent " \
+                          "relations among events in texts. The subevent relation, labeled as SUBEVENT, denotes a " \
+                          "hierarchical relation where the first event is contained by the second, the inverse " \
+                          "relation SUPEREVENT denotes that the second event is contained by the first. In the " \
+                          "provided document, event trigger words are annotated within angle brackets (<>), only the " \
+                          "events after the given event are annotated. The desired outcome is a list of events in the " \
+                          "document that have a subevent relation with the given event. The prescribed output format " \
+                          "should follow this structure: 'relation1: event1, event2; relation2: event3, event4'. The " \
+                          "output 'relation: none' indicates that the given event lacks this particular type of " \
+                          "relation with other events."
+
+MULTI_TARGET_DESC = " Several given events are asked at once, the answer of every given event is written in its own " \
+                    "block that begins with the given event, e.g. '<e1 event>: relation1: event2, event3; " \
+                    "relation2: none'."
+
+TASK_DESC_JOINT = "The current task is a joint event relation extraction task, which aims to identify temporal, " \
+                  "causal, subevent, and coreference relations among events in texts. The temporal relation refers " \
+                  "to the chronological order of events, involving six subtypes, namely, SIMULTANEOUS, ENDS-ON, " \
+                  "BEGINS-ON, OVERLAP, CONTAINS, and BEFORE. The causal relation denotes that the occurrence of the " \
+                  "first event precipitates the happening of the second event, delineated into two subtypes: CAUSE " \
+                  "and PRECONDITION. The subevent relation, labeled as SUBEVENT, denotes a hierarchical relation " \
+                  "where the first event is contained by the second. The coreference relation, labeled as " \
+                  "COREFERENCE, denotes that two events are the same one. In the provided document, event trigger " \
+                  "words are annotated within angle brackets (<>). The desired outcome is a list of events in the " \
+                  "document that have relations with the given event. The answer of every relation family is " \
+                  "written in its own section that begins with a line naming the family, 'Temporal relations:', " \
+                  "'Causal relations:', 'Subevent relations:', or 'Coreference relations:', a time expression is " \
+                  "only asked for its temporal relations. The prescribed output format of a section should follow " \
+                  "this structure: 'relation1: event1, event2; relation2: event3, event4'. The output 'relation: " \
+                  "none' indicates that the given event lacks this particular type of relation with other events."
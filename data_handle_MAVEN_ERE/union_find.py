@@ -0,0 +1,74 @@
+class UnionFind:
+    """
+    union-find with path halving and union by size over the given items
+    """
+
+    def __init__(self, items):
+        self.parent = {item: item for item in items}
+        self.sizes = {item: 1 for item in self.parent}
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, item1, item2):
+        root1, root2 = self.find(item1), self.find(item2)
+        if root1 == root2:
+            return
+        if self.sizes[root1] < self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.sizes[root1] += self.sizes[root2]
+
+    def size(self, item):
+        return self.sizes[self.find(item)]
+
+    def get_members(self):
+        """
+        {root: [items of its set]}, the items in their original order
+        """
+        members = {}
+        for item in self.parent:
+            members.setdefault(self.find(item), []).append(item)
+        return members
+
+
+class ConfirmedClusters:
+    """
+    the clusters of the cluster-level coreference prompting, the targets are asked in order: two asked targets are
+    merged if they name each other like in the default evaluation; a target named by an asked target of a confirmed
+    cluster (size > 1) is absorbed into that cluster and not asked, so a single spurious answer can not merge clusters
+    """
+
+    def __init__(self, items):
+        self.union_find = UnionFind(items)
+        self.asked = set()
+        self.links = set()
+        # the asked targets naming an item, in the order they were asked
+        self.named_by = {}
+
+    def absorb(self, item):
+        """
+        absorb item into the first confirmed cluster of an asked target naming it, False if item has to be asked
+        """
+        for head in self.named_by.get(item, []):
+            if self.union_find.size(head) > 1:
+                self.union_find.union(head, item)
+                return True
+        return False
+
+    def ask(self, item):
+        self.asked.add(item)
+
+    def add_link(self, head, tail):
+        """
+        the asked target head names tail as coreferent
+        """
+        if head == tail or (head, tail) in self.links:
+            return
+        self.links.add((head, tail))
+        self.named_by.setdefault(tail, []).append(head)
+        if tail in self.asked and (tail, head) in self.links:
+            self.union_find.union(head, tail)
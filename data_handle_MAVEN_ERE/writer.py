@@ -0,0 +1,98 @@
+import os
+import json
+
+from compact import compact_examples, dump_compact
+
+
+class ExampleWriter:
+    """
+    write the converted examples of one split, either as a single {split}.json file (output_format="json")
+    or streamed line by line into {split}.jsonl (output_format="jsonl"),
+    or with the instructions and document bodies stored once into {split}.compact.json (output_format="compact")
+    """
+
+    def __init__(self, new_data_path, split, output_format="json", subsample=False):
+        assert output_format in ["json", "jsonl", "compact"]
+        self.new_data_path = new_data_path
+        self.split = split
+        self.output_format = output_format
+        self.subsample = subsample
+        self.num_pos, self.num_neg = 0, 0
+        self.order = None
+
+        if output_format in ["json", "compact"]:
+            self.examples = []
+            self.examples_pos, self.examples_neg = [], []
+        elif subsample:
+            # positives and negatives are spooled to disk, only their line offsets stay in memory
+            self.spool_files = [open(self.get_spool_file(name), "wb+") for name in ["pos", "neg"]]
+            self.spool_offsets = [[], []]
+        else:
+            self.file = open(os.path.join(new_data_path, f"{split}.jsonl"), "w", encoding="utf-8")
+
+    def get_spool_file(self, name):
+        return os.path.join(self.new_data_path, f"{self.split}.{name}.jsonl.tmp")
+
+    def add(self, item_dict, negative=False):
+        if negative:
+            self.num_neg += 1
+        else:
+            self.num_pos += 1
+
+        if self.output_format in ["json", "compact"]:
+            if not self.subsample:
+                self.examples.append(item_dict)
+            elif negative:
+                self.examples_neg.append(item_dict)
+            else:
+                self.examples_pos.append(item_dict)
+        elif self.subsample:
+            source = 1 if negative else 0
+            self.spool_offsets[source].append(self.spool_files[source].tell())
+            self.spool_files[source].write((json.dumps(item_dict, ensure_ascii=False) + "\n").encode("utf-8"))
+        else:
+            self.file.write(json.dumps(item_dict, ensure_ascii=False) + "\n")
+
+    def sample(self, rng, neg_num, keep_num=None):
+        """
+        keep all positives and neg_num random negatives, shuffled; the random draws are the same for all
+        output formats, so the kept examples and their order do not depend on output_format
+        """
+        order = [(0, index) for index in range(self.num_pos)]
+        # e.g. multi-target prompts are only negative if none of their targets has a relation
+        neg_num = min(neg_num, self.num_neg)
+        order += [(1, index) for index in rng.sample(range(self.num_neg), neg_num)]
+        rng.shuffle(order)
+        if keep_num is not None:
+            order = order[:keep_num]
+        self.order = order
+        return len(order)
+
+    def get_order(self):
+        if self.order is not None:
+            return self.order
+        return [(0, index) for index in range(self.num_pos)] + [(1, index) for index in range(self.num_neg)]
+
+    def close(self):
+        if self.output_format in ["json", "compact"]:
+            if self.subsample:
+                sources = [self.examples_pos, self.examples_neg]
+                examples = [sources[source][index] for source, index in self.get_order()]
+            else:
+                examples = self.examples
+            if self.output_format == "compact":
+                dump_compact(compact_examples(examples), os.path.join(self.new_data_path, f"{self.split}.compact.json"))
+                return
+            new_data_file = os.path.join(self.new_data_path, f"{self.split}.json")
+            with open(new_data_file, 'w') as f:
+                json.dump(examples, f, indent=4, ensure_ascii=False)
+        elif self.subsample:
+            with open(os.path.join(self.new_data_path, f"{self.split}.jsonl"), "wb") as f:
+                for source, index in self.get_order():
+                    self.spool_files[source].seek(self.spool_offsets[source][index])
+                    f.write(self.spool_files[source].readline())
+            for name, spool_file in zip(["pos", "neg"], self.spool_files):
+                spool_file.close()
+                os.remove(self.get_spool_file(name))
+        else:
+            self.file.close()
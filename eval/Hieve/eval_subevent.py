@@ -1,9 +1,12 @@
 import argparse
 import os
 import json
-from sklearn.metrics import classification_report, confusion_matrix
+import numpy as np
 
 from constant import *
+from report import ConfusionMatrix
+from prediction_parser import PredictionParser
+from stream import DocumentStream
 
 
 class Document:
@@ -44,85 +47,31 @@ class Document:
 
 
 def get_relation_labels(doc, pair2rel, ignore_nonetype=False):
-    labels = []
-    for i, e1 in enumerate(doc.events_sorted):
-        for j, e2 in enumerate(doc.events_sorted):
-            if i == j:
-                continue
-            if i > j:  # only consider e1 before e2
-                labels.append(-100)
-                continue
-            if ignore_nonetype:
-                labels.append(pair2rel.get((e1["id"], e2["id"]), -100))
-            else:
-                labels.append(pair2rel.get((e1["id"], e2["id"]), REL2ID_DICT[doc.dataname]["NONE"]))
-    assert len(labels) == len(doc.events_sorted) ** 2 - len(doc.events_sorted)
-    return labels
-
-
-def filter_label(label_list, pred_list):
-    new_label_list = []
-    new_pred_list = []
-    for label, pred in zip(label_list, pred_list):
-        if label != -100:
-            new_label_list.append(label)
-            new_pred_list.append(pred)
-
-    return new_label_list, new_pred_list
+    event_id2index = {e["id"]: index for index, e in enumerate(doc.events_sorted)}
+    if ignore_nonetype:
+        labels = np.full((len(doc.events_sorted), len(doc.events_sorted)), -100, dtype=np.int8)
+    else:
+        labels = np.full((len(doc.events_sorted), len(doc.events_sorted)), REL2ID_DICT[doc.dataname]["NONE"],
+                         dtype=np.int8)
+    for (e1_id, e2_id), rel in pair2rel.items():
+        if e1_id in event_id2index and e2_id in event_id2index:
+            labels[event_id2index[e1_id], event_id2index[e2_id]] = rel
+    # only consider e1 before e2
+    labels[np.tril_indices(len(doc.events_sorted), -1)] = -100
+    return labels[~np.eye(len(doc.events_sorted), dtype=bool)]
 
 
 def convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num):
-    rel_label_list = []
-    rel_pred_list = []
-
-    pairs_dict_list = []
-    for data_predict in dataset_predict:
-        # get predict event pairs
-        data_json = json.loads(data_predict)
-        predict_text = data_json["predict"]
-        predict_text = predict_text.split("\n")[0]
-        relation_text_list = predict_text.strip().rstrip(".").split("; ")
-
-        pairs_dict = {}
-        for index, relation_text in enumerate(relation_text_list):
-            try:
-                relation_label = relation_text.split(": ")[0].lstrip(" ")
-                pairs = relation_text.split(": ")[1]
-                none_list = ["none", "none.", "NONE", "NONE.", "None", "None."]
-                if pairs in none_list:
-                    pairs_list = []
-                else:
-                    pairs_list = pairs.split(">, <")
-            except:
-                pairs_list = []
-                print("*" * 10)
-                print(relation_text_list)
-                print(relation_text)
-                print("*" * 10)
-
-            pairs_list_new = [x.lstrip("<").rstrip(">").split(" ")[0] for x in pairs_list]
-            pairs_dict[relation_label] = pairs_list_new
-        pairs_dict_list.append(pairs_dict)
-    assert len(dataset_predict) == len(pairs_dict_list)
-    doc_split_num_sum = sum(doc_split_num)
-    assert doc_split_num_sum == len(dataset_predict)
-
-    start_index_events, start_index_examples = 0, 0
-    for data_golden in dataset_golden:
-        data_golden_json = json.loads(data_golden)
-        doc = Document(data_golden_json, "hievents")
-
-        rel_label_list.extend(get_relation_labels(doc, doc.subevent_dict, ignore_nonetype=False))
-
-        end_index_events = start_index_events + len(doc.events_sorted)
-        doc_split_num_item = doc_split_num[start_index_events: end_index_events]
-        start_index_events = end_index_events
+    confusion_matrix = ConfusionMatrix(len(REL2ID_DICT["hievents"]))
+
+    parser = PredictionParser(">, <")
+    stream = DocumentStream(dataset_golden, dataset_predict, doc_split_num, lambda data: Document(data, "hievents"),
+                            lambda doc: doc.events_sorted, parser)
+    for doc, event_preds in stream:
+        rel_labels = get_relation_labels(doc, doc.subevent_dict, ignore_nonetype=False)
 
         rel_pred_dict = {}
-        for event, examples_num_item in zip(doc.events_sorted, doc_split_num_item):
-            end_index_examples = start_index_examples + examples_num_item
-            pairs_preds = pairs_dict_list[start_index_examples: end_index_examples]
-            start_index_examples = end_index_examples
+        for event, pairs_preds in event_preds:
             for pairs_pred in pairs_preds:
                 e1_id = event["id"]
                 e1_map_id = doc.event_id2num[e1_id]
@@ -149,17 +98,14 @@ def convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num):
                                         rel_pred_dict[(e1_id, e2_id)] = REL2ID_DICT["hievents"][label]
                             except:
                                 print(f"event {e2_map_id} does not exist")
-        rel_pred_list.extend(get_relation_labels(doc, rel_pred_dict, ignore_nonetype=False))
-    assert start_index_examples == len(pairs_dict_list)
+        rel_preds = get_relation_labels(doc, rel_pred_dict, ignore_nonetype=False)
+        confusion_matrix.update(rel_labels, rel_preds)
 
+    print(parser.summary())
     result_collection = {}
-    rel_label_list, rel_pred_list = filter_label(rel_label_list, rel_pred_list)
-    assert len(rel_label_list) == len(rel_pred_list)
-    print(f"rel_label_list: {len(rel_label_list)}")
-    subevent_res = classification_report(rel_label_list, rel_pred_list, output_dict=True,
-                                         target_names=REPORT_CLASS_NAMES_subevent, labels=REPORT_CLASS_LABELS_subevent,
-                                         zero_division=0)
-    # print(confusion_matrix(rel_label_list, rel_pred_list))
+    print(f"rel_label_list: {confusion_matrix.num_pairs}")
+    subevent_res = confusion_matrix.get_report(REPORT_CLASS_LABELS_subevent, REPORT_CLASS_NAMES_subevent)
+    # print(confusion_matrix.matrix)
     # print(subevent_res)
     result_collection["Subevent"] = subevent_res
     print(f"Subevent: precision={subevent_res['micro avg']['precision'] * 100:.5f}, "
@@ -175,14 +121,12 @@ def do_convert(args):
     if not os.path.exists(args.golden_file):
         raise ValueError("Please input the correct path of predict file.")
 
-    with open(args.golden_file, "r", encoding="utf-8") as f:
-        dataset_golden = f.readlines()
-    with open(args.predict_file, "r", encoding="utf-8") as f:
-        dataset_predict = f.readlines()
     with open(args.split_num_file, "r", encoding="utf-8") as f:
         doc_split_num = json.load(f)
 
-    result_collection = convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num)
+    with open(args.golden_file, "r", encoding="utf-8") as f_golden, \
+            open(args.predict_file, "r", encoding="utf-8") as f_predict:
+        result_collection = convert_and_evaluate(f_golden, f_predict, doc_split_num)
 
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
@@ -195,6 +139,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--result_version", type=str, default="Hieve_subevent",
                         help="The predict results, only support the JSON format.")
+    parser.add_argument("--half", action="store_true",
+                        help="The predictions of the half prompts converted with --half, every pair is asked from its "
+                             "earlier event which is the pair evaluated here.")
     args = parser.parse_args()
 
     file_dir = os.path.dirname(__file__)
@@ -204,8 +151,9 @@ if __name__ == "__main__":
                                      "generated_predictions.jsonl")
     args.golden_file = os.path.join(args.project_path,
                                     f"data/processed/hievents/test.json")
+    split_dataset_name = "Hieve_half" if args.half else "Hieve"
     args.split_num_file = os.path.join(args.project_path,
-                                       f"data/converted/Hieve/test_split.json")
+                                       f"data/converted/{split_dataset_name}/test_split.json")
     args.output_dir = os.path.join(args.project_path, "output/eval", args.result_version)
 
     do_convert(args)
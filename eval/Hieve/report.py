@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def get_prf(tp, pred, true):
+    # zero_division=0, and the f1 of precision and recall as in classification_report
+    precision = tp / pred if pred > 0 else 0.0
+    recall = tp / true if true > 0 else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return precision, recall, f1
+
+
+def get_classification_report(tp, pred, true, labels, target_names):
+    """
+    the output_dict of sklearn.metrics.classification_report(..., zero_division=0) from the per-label counts,
+    tp/pred/true are indexed by label and also count the labels that are not reported;
+    the f1 is computed from precision and recall like the sklearn version of the released results
+    """
+    report = {}
+    scores = []
+    for label, name in zip(labels, target_names):
+        precision, recall, f1 = get_prf(tp[label], pred[label], true[label])
+        report[name] = {"precision": precision, "recall": recall, "f1-score": f1, "support": true[label]}
+        scores.append((precision, recall, f1, true[label]))
+
+    support = sum(true[label] for label in labels)
+    micro = get_prf(sum(tp[label] for label in labels), sum(pred[label] for label in labels), support)
+    macro = [sum(score[i] for score in scores) / len(scores) for i in range(3)]
+    if support > 0:
+        weighted = [sum(score[i] * score[3] for score in scores) / support for i in range(3)]
+    else:
+        weighted = [0.0, 0.0, 0.0]
+
+    present_labels = [label for label in range(len(true)) if true[label] > 0 or pred[label] > 0]
+    if set(labels) >= set(present_labels):
+        # the micro average of all present labels is reported as the accuracy
+        report["accuracy"] = micro[0]
+    else:
+        report["micro avg"] = dict(zip(["precision", "recall", "f1-score"], micro), support=support)
+    report["macro avg"] = dict(zip(["precision", "recall", "f1-score"], macro), support=support)
+    report["weighted avg"] = dict(zip(["precision", "recall", "f1-score"], weighted), support=support)
+    return report
+
+
+class ConfusionMatrix:
+    """
+    confusion matrix of the relation labels (rows: golden, columns: predicted), accumulated per document
+    either from label arrays or from the sparse pair dicts
+    """
+
+    def __init__(self, num_labels):
+        self.num_labels = num_labels
+        self.matrix = np.zeros((num_labels, num_labels), dtype=np.int64)
+
+    def update(self, labels, preds, ignore_label=-100):
+        """
+        labels/preds: NumPy integer arrays of the same shape, the positions with labels == ignore_label are skipped
+        """
+        mask = labels != ignore_label
+        index = labels[mask].astype(np.int64) * self.num_labels + preds[mask]
+        self.matrix += np.bincount(index, minlength=self.num_labels ** 2).reshape(self.num_labels, self.num_labels)
+
+    def update_pairs(self, event_ids, gold_dict, pred_dict, none_label=0):
+        """
+        the labels of all ordered pairs of event_ids, only the pairs in gold_dict or pred_dict are visited;
+        the other pairs are NONE on both sides and counted analytically
+        """
+        event_ids = set(event_ids)
+        pairs = set()
+        for pair, label in list(gold_dict.items()) + list(pred_dict.items()):
+            if label != none_label and pair[0] != pair[1] and pair[0] in event_ids and pair[1] in event_ids:
+                pairs.add(pair)
+        labels = np.array([gold_dict.get(pair, none_label) for pair in pairs], dtype=np.int64)
+        preds = np.array([pred_dict.get(pair, none_label) for pair in pairs], dtype=np.int64)
+        self.update(labels, preds)
+        self.matrix[none_label, none_label] += len(event_ids) * (len(event_ids) - 1) - len(pairs)
+
+    def merge(self, other):
+        self.matrix += other.matrix
+
+    @property
+    def num_pairs(self):
+        return int(self.matrix.sum())
+
+    def get_report(self, labels, target_names):
+        tp = np.diag(self.matrix).tolist()
+        pred = self.matrix.sum(axis=0).tolist()
+        true = self.matrix.sum(axis=1).tolist()
+        return get_classification_report(tp, pred, true, labels, target_names)
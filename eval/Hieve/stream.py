@@ -0,0 +1,45 @@
+import itertools
+import json
+
+
+class DocumentStream:
+    """
+    walk the golden documents together with their slice of doc_split_num and the lazily parsed predictions,
+    only the golden lines and the predictions of the current document are held in memory
+    """
+
+    def __init__(self, dataset_golden, dataset_predict, doc_split_num, load_document, get_events, parse_prediction):
+        # dataset_golden/dataset_predict: iterables of JSON lines, e.g. the open files
+        # get_events(doc): the events of a document in the order of doc_split_num
+        self.dataset_golden = dataset_golden
+        self.dataset_predict = dataset_predict
+        self.doc_split_num = doc_split_num
+        self.load_document = load_document
+        self.get_events = get_events
+        self.parse_prediction = parse_prediction
+        self.num_examples = 0
+
+    def __iter__(self):
+        """
+        yield (doc, [(event, pairs_preds), ...]) per golden document
+        """
+        predictions = map(self.parse_prediction, self.dataset_predict)
+        start_index_events = 0
+        for data_golden in self.dataset_golden:
+            doc = self.load_document(json.loads(data_golden))
+            events = self.get_events(doc)
+
+            end_index_events = start_index_events + len(events)
+            doc_split_num_item = self.doc_split_num[start_index_events: end_index_events]
+            start_index_events = end_index_events
+
+            event_preds = []
+            for event, examples_num_item in zip(events, doc_split_num_item):
+                pairs_preds = list(itertools.islice(predictions, examples_num_item))
+                self.num_examples += len(pairs_preds)
+                event_preds.append((event, pairs_preds))
+            yield doc, event_preds
+
+        # every prediction belongs to an event of the golden documents
+        assert next(predictions, None) is None
+        assert sum(self.doc_split_num) == self.num_examples
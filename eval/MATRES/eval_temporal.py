@@ -2,9 +2,12 @@ import argparse
 import os
 import json
 import copy
-from sklearn.metrics import classification_report
+import numpy as np
 
 from constant import *
+from report import ConfusionMatrix
+from prediction_parser import PredictionParser
+from stream import DocumentStream
 
 
 class Document:
@@ -87,32 +90,20 @@ class Document:
 
 
 def get_golden_relation_labels(doc, pair2rel, ignore_nonetype=True):
-    labels = []
-    for i, e1 in enumerate(doc.events_clean):
-        for j, e2 in enumerate(doc.events_clean):
-            if i == j:
-                continue
-            if doc.dataname in ["matres", "tcr"]:
-                if ignore_nonetype:
-                    labels.append(pair2rel.get((e1["eiid"], e2["eiid"]), -100))
-                else:
-                    labels.append(pair2rel.get((e1["eiid"], e2["eiid"]), REL2ID_DICT["matres"]["NONE"]))
-    assert len(labels) == len(doc.events_clean) ** 2 - len(doc.events_clean)
-    return labels
+    if ignore_nonetype:
+        labels = get_label_matrix(doc, pair2rel, -100)
+    else:
+        labels = get_label_matrix(doc, pair2rel, REL2ID_DICT["matres"]["NONE"])
+    return labels[~np.eye(len(doc.events_clean), dtype=bool)]
 
 
 def get_pred_relation_labels(doc, pair2rel, ignore_nonetype=True):
-    labels = []
-    for i, e1 in enumerate(doc.events_clean):
-        for j, e2 in enumerate(doc.events_clean):
-            if i == j:
-                continue
-            if ignore_nonetype:
-                labels.append(pair2rel.get((e1["eiid"], e2["eiid"]), REL2ID_DICT["matres"]["VAGUE"]))
-            else:
-                labels.append(pair2rel.get((e1["eiid"], e2["eiid"]), REL2ID_DICT["matres"]["NONE"]))
-    assert len(labels) == len(doc.events_clean) ** 2 - len(doc.events_clean)
-    count = len([x for x in labels if x != 3])
+    if ignore_nonetype:
+        labels = get_label_matrix(doc, pair2rel, REL2ID_DICT["matres"]["VAGUE"])
+    else:
+        labels = get_label_matrix(doc, pair2rel, REL2ID_DICT["matres"]["NONE"])
+    labels = labels[~np.eye(len(doc.events_clean), dtype=bool)]
+    count = np.count_nonzero(labels != 3)
     try:
         assert count == len(pair2rel)
     except:
@@ -121,70 +112,30 @@ def get_pred_relation_labels(doc, pair2rel, ignore_nonetype=True):
     return labels
 
 
-def filter_label(label_list, pred_list):
-    new_label_list = []
-    new_pred_list = []
-    for label, pred in zip(label_list, pred_list):
-        if label != -100:
-            new_label_list.append(label)
-            new_pred_list.append(pred)
-
-    return new_label_list, new_pred_list
+def get_label_matrix(doc, pair2rel, default_label):
+    """
+    labels of all ordered pairs of doc.events_clean in a preallocated int8 matrix, row e1 and column e2
+    """
+    event_id2index = {e["eiid"]: index for index, e in enumerate(doc.events_clean)}
+    labels = np.full((len(doc.events_clean), len(doc.events_clean)), default_label, dtype=np.int8)
+    for (e1_id, e2_id), rel in pair2rel.items():
+        if e1_id in event_id2index and e2_id in event_id2index:
+            labels[event_id2index[e1_id], event_id2index[e2_id]] = rel
+    return labels
 
 
 def convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num):
-    rel_label_list = []
-    rel_pred_list = []
-
-    pairs_dict_list = []
-    for data_predict in dataset_predict:
-        # get predict event pairs
-        data_json = json.loads(data_predict)
-        predict_text = data_json["predict"]
-        predict_text = predict_text.split("\n")[0]
-        relation_text_list = predict_text.strip().rstrip(".").split("; ")
-
-        pairs_dict = {}
-        for index, relation_text in enumerate(relation_text_list):
-            try:
-                relation_label = relation_text.split(": ")[0].lstrip(" ")
-                pairs = relation_text.split(": ")[1]
-                none_list = ["none", "none.", "NONE", "NONE.", "None", "None."]
-                if pairs in none_list:
-                    pairs_list = []
-                else:
-                    pairs_list = pairs.split(">, <")
-            except:
-                pairs_list = []
-                print("*" * 10)
-                print(relation_text_list)
-                print(relation_text)
-                print("*" * 10)
-
-            pairs_list_new = [x.lstrip("<").rstrip(">").split(" ")[0] for x in pairs_list]
-            pairs_dict[relation_label] = pairs_list_new
-        pairs_dict_list.append(pairs_dict)
-    assert len(dataset_predict) == len(pairs_dict_list)
-    doc_split_num_sum = sum(doc_split_num)
-    assert doc_split_num_sum == len(dataset_predict)
-
-    start_index_events, start_index_examples = 0, 0
-    for data_golden in dataset_golden:
-        data_golden_json = json.loads(data_golden)
-        doc = Document(data_golden_json, "MATRES", ignore_nonetype=True)
-
-        rel_label_list.extend(get_golden_relation_labels(doc, doc.temporal_dict))
-
-        end_index_events = start_index_events + len(doc.candidate_events)
-        doc_split_num_item = doc_split_num[start_index_events: end_index_events]
-        start_index_events = end_index_events
+    confusion_matrix = ConfusionMatrix(len(REL2ID_DICT["matres"]))
+
+    parser = PredictionParser(">, <")
+    stream = DocumentStream(dataset_golden, dataset_predict, doc_split_num,
+                            lambda data: Document(data, "MATRES", ignore_nonetype=True),
+                            lambda doc: [doc.enum2events[event] for event in doc.candidate_events], parser)
+    for doc, event_preds in stream:
+        rel_labels = get_golden_relation_labels(doc, doc.temporal_dict)
 
         rel_pred_dict = {}
-        for event, examples_num_item in zip(doc.candidate_events, doc_split_num_item):
-            event = doc.enum2events[event]
-            end_index_examples = start_index_examples + examples_num_item
-            pairs_preds = pairs_dict_list[start_index_examples: end_index_examples]
-            start_index_examples = end_index_examples
+        for event, pairs_preds in event_preds:
             for pairs_pred in pairs_preds:
                 e1_id = event["eiid"]
 
@@ -210,15 +161,12 @@ def convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num):
                                         rel_pred_dict[(e1_id, e2_id)] = REL2ID_DICT["matres"][label]
                             except:
                                 print(f"event {e2_map_id} does not exist")
-        rel_pred_list.extend(get_pred_relation_labels(doc, rel_pred_dict, ignore_nonetype=True))
-    assert start_index_examples == len(pairs_dict_list)
+        rel_preds = get_pred_relation_labels(doc, rel_pred_dict, ignore_nonetype=True)
+        confusion_matrix.update(rel_labels, rel_preds)
 
+    print(parser.summary())
     result_collection = {}
-    rel_label_list, rel_pred_list = filter_label(rel_label_list, rel_pred_list)
-    assert len(rel_label_list) == len(rel_pred_list)
-    temporal_res = classification_report(rel_label_list, rel_pred_list, output_dict=True,
-                                         target_names=TEMP_REPORT_CLASS_NAMES, labels=TEMP_REPORT_CLASS_LABELS,
-                                         zero_division=0)
+    temporal_res = confusion_matrix.get_report(TEMP_REPORT_CLASS_LABELS, TEMP_REPORT_CLASS_NAMES)
     result_collection["Temporal"] = temporal_res
     print(f"Temporal: precision={temporal_res['micro avg']['precision'] * 100:.5f}, "
           f"recall={temporal_res['micro avg']['recall'] * 100:.5f}, "
@@ -233,14 +181,12 @@ def do_convert(args):
     if not os.path.exists(args.golden_file):
         raise ValueError("Please input the correct path of predict file.")
 
-    with open(args.golden_file, "r", encoding="utf-8") as f:
-        dataset_golden = f.readlines()
-    with open(args.predict_file, "r", encoding="utf-8") as f:
-        dataset_predict = f.readlines()
     with open(args.split_num_file, "r", encoding="utf-8") as f:
         doc_split_num = json.load(f)
 
-    result_collection = convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num)
+    with open(args.golden_file, "r", encoding="utf-8") as f_golden, \
+            open(args.predict_file, "r", encoding="utf-8") as f_predict:
+        result_collection = convert_and_evaluate(f_golden, f_predict, doc_split_num)
 
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
@@ -0,0 +1,91 @@
+import json
+
+NONE_LIST = ["none", "none.", "NONE", "NONE.", "None", "None."]
+
+
+class PredictionParser:
+    """
+    parse the first line of a generated prediction, "REL1: <e1 trigger>, <e2 trigger>; REL2: none.",
+    into {relation: [map ids]} in one pass; a relation text without ": " maps to [] and is counted as malformed
+    """
+
+    def __init__(self, separator=", ", multi_target=False):
+        # separator: between the tagged events of a relation, ">, <" for temporal relations
+        # multi_target: the predictions hold one answer block per given event, see parse_targets
+        self.separator = separator
+        self.multi_target = multi_target
+        self.num_predictions = 0
+        self.num_missing_targets = 0
+        self.num_malformed_predictions = 0
+        self.num_malformed_texts = 0
+        self.malformed_example = None
+
+    def parse_text(self, predict_text):
+        relation_text_list = predict_text.split("\n", 1)[0].strip().rstrip(".").split("; ")
+
+        pairs_dict = {}
+        malformed = False
+        for relation_text in relation_text_list:
+            relation_label, found, pairs = relation_text.partition(": ")
+            relation_label = relation_label.lstrip(" ")
+            if not found:
+                malformed = True
+                self.num_malformed_texts += 1
+                if self.malformed_example is None:
+                    self.malformed_example = relation_text
+                pairs_dict[relation_label] = []
+                continue
+
+            # only the text up to a second ": " holds the events
+            pairs = pairs.partition(": ")[0]
+            if pairs in NONE_LIST:
+                pairs_dict[relation_label] = []
+            else:
+                pairs_dict[relation_label] = [x.lstrip("<").rstrip(">").partition(" ")[0]
+                                              for x in pairs.split(self.separator)]
+
+        self.num_predictions += 1
+        self.num_malformed_predictions += malformed
+        return pairs_dict
+
+    def parse_targets(self, predict_text):
+        """
+        split a multi-target prediction into the answer blocks of its given events,
+        "<e3 trigger>: REL1: ...; REL2: ...", and parse each of them into {target map id: pairs_dict};
+        the other lines of a block are ignored like in parse_text, a repeated given event keeps its first block
+        """
+        targets_dict = {}
+        for line in predict_text.split("\n"):
+            target_tag, found, relation_text = line.strip().partition(">: ")
+            if not found or not target_tag.startswith("<"):
+                continue
+            map_id = target_tag[1:].partition(" ")[0]
+            if map_id not in targets_dict:
+                targets_dict[map_id] = self.parse_text(relation_text)
+        return targets_dict
+
+    def get_target_preds(self, targets_dicts, map_ids):
+        """
+        the pairs_dicts of every given event of a group from the parsed predictions of its prompts,
+        a prompt without the block of a given event is counted as a missing target
+        """
+        target_preds = []
+        for map_id in map_ids:
+            pairs_preds = [targets_dict[map_id] for targets_dict in targets_dicts if map_id in targets_dict]
+            self.num_missing_targets += len(targets_dicts) - len(pairs_preds)
+            target_preds.append(pairs_preds)
+        return target_preds
+
+    def __call__(self, data_predict):
+        if self.multi_target:
+            return self.parse_targets(json.loads(data_predict)["predict"])
+        return self.parse_text(json.loads(data_predict)["predict"])
+
+    def summary(self):
+        summary = f"malformed predictions: {self.num_malformed_predictions}/{self.num_predictions}, " \
+                  f"malformed relation texts: {self.num_malformed_texts}"
+        if self.malformed_example is not None:
+            summary += f", e.g. {self.malformed_example!r}"
+        if self.multi_target:
+            summary += f", missing target blocks: {self.num_missing_targets}"
+        return summary
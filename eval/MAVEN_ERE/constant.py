@@ -26,6 +26,24 @@ SUBEVENTREL2ID = {
 
 BIDIRECTIONAL_REL = ["SIMULTANEOUS", "BEGINS-ON"]
 
+# in the half prompts a pair is only asked from its earlier event, the relations from the later event are
+# named by their inverse relations
+INVERSE_REL = {
+    "ENDS-ON": "ENDED-ON-BY",
+    "OVERLAP": "OVERLAPPED-BY",
+    "CONTAINS": "CONTAINED-BY",
+    "BEFORE": "AFTER",
+    "SUBEVENT": "SUPEREVENT"
+}
+
+# the joint prompts answer every relation family in its own section that begins with a line "{name}:"
+JOINT_SECTIONS = {
+    "temporal": "Temporal relations",
+    "causal": "Causal relations",
+    "subevent": "Subevent relations",
+    "coref": "Coreference relations"
+}
+
 ID2COREFREL = {v: k for k, v in COREFREL2ID.items()}
 ID2TEMPREL = {v: k for k, v in TEMPREL2ID.items()}
 ID2CAUSALREL = {v: k for k, v in CAUSALREL2ID.items()}
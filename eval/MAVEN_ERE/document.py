@@ -0,0 +1,83 @@
+import copy
+import itertools
+from functools import cached_property
+
+from constant import *
+
+
+class Document:
+    def __init__(self, data):
+        self.id = data["id"]
+        self.words = data["tokens"]
+        self.mentions = []
+        self.events = []
+        self.eid2mentions = {}
+
+        if "events" in data:
+            for e in data["events"]:
+                self.events += e["mention"]
+            for e in data["events"]:
+                self.eid2mentions[e["id"]] = e["mention"]
+        else:
+            self.events = copy.deepcopy(data['event_mentions'])
+
+        self.timexes = data["TIMEX"]
+        for t in data["TIMEX"]:
+            self.eid2mentions[t["id"]] = [t]
+        self.events_all = self.events + self.timexes
+
+        self.sort_events()
+        self.map_events()
+        self.map_timexes()
+
+        # the relation dicts are only built for the tasks that are evaluated
+        self.data = data
+
+    @cached_property
+    def temporal_dict(self):
+        return self.load_relation_dict(self.data["temporal_relations"], TEMPREL2ID)
+
+    @cached_property
+    def causal_dict(self):
+        return self.load_relation_dict(self.data["causal_relations"], CAUSALREL2ID)
+
+    @cached_property
+    def subevent_dict(self):
+        return self.load_relation_dict({"SUBEVENT": self.data["subevent_relations"]}, SUBEVENTREL2ID)
+
+    @cached_property
+    def coref_dict(self):
+        return self.load_coref_dict(self.data)
+
+    def sort_events(self):
+        self.events_all = sorted(self.events_all, key=lambda x: (x["sent_id"], x["offset"][0]))
+
+    def map_events(self):
+        self.events = sorted(self.events, key=lambda x: (x["sent_id"], x["offset"][0]))
+        self.event_num2id = {f"e{index}": e["id"] for index, e in enumerate(self.events)}
+        self.event_id2num = {e["id"]: f"e{index}" for index, e in enumerate(self.events)}
+
+    def map_timexes(self):
+        self.timexes = sorted(self.timexes, key=lambda x: (x["sent_id"], x["offset"][0]))
+        self.timex_num2id = {f"t{index}": t["id"] for index, t in enumerate(self.timexes)}
+        self.timex_id2num = {t["id"]: f"t{index}" for index, t in enumerate(self.timexes)}
+
+    def load_coref_dict(self, data):
+        pair2rel = {}
+        for event in data["events"]:
+            for mention1, mention2 in itertools.permutations(event["mention"], 2):
+                # coref is bidirectional
+                pair2rel[(mention1["id"], mention2["id"])] = COREFREL2ID["COREFERENCE"]
+        return pair2rel
+
+    def load_relation_dict(self, relations, REL2ID):
+        pair2rel = {}
+        for rel in relations:
+            for pair in relations[rel]:
+                # first mention as the event mention
+                for e1 in self.eid2mentions[pair[0]]:
+                    for e2 in self.eid2mentions[pair[1]]:
+                        pair2rel[(e1["id"], e2["id"])] = REL2ID[rel]
+                        if rel in BIDIRECTIONAL_REL:
+                            pair2rel[(e2["id"], e1["id"])] = REL2ID[rel]
+        return pair2rel
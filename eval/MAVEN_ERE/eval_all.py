@@ -0,0 +1,207 @@
+import argparse
+import itertools
+import os
+import json
+from contextlib import ExitStack
+from functools import partial
+
+import eval_temporal
+import eval_causal
+import eval_subevent
+import eval_coref
+from prediction_parser import PredictionParser
+from joint import demux_task
+from stream import PredictionSlicer, map_documents
+
+TASK_MODULES = {
+    "temporal": eval_temporal,
+    "causal": eval_causal,
+    "subevent": eval_subevent,
+    "coref": eval_coref,
+}
+# the tasks that support the half prompts, see INVERSE_REL
+HALF_TASKS = ["temporal", "subevent"]
+
+
+def get_task_dir(task, half=False, multi_target=False, joint=False):
+    if joint:
+        return "joint"
+    if half and task in HALF_TASKS:
+        return f"{task}_half"
+    if multi_target:
+        return f"{task}_multi"
+    return task
+
+
+def iter_documents(dataset_golden, slicers, modules):
+    """
+    yield (data, [event_preds of every task]) per golden document, each task follows its own doc_split_num
+    """
+    for data_golden in dataset_golden:
+        data = json.loads(data_golden)
+        yield data, [slicer.take(module.count_events(data)) for slicer, module in zip(slicers, modules)]
+    for slicer in slicers:
+        slicer.finish()
+
+
+def evaluate_tasks(evaluate_functions, doc, task_event_preds):
+    # the document and its lazily built relation dicts are shared by the tasks
+    return [evaluate_document(doc, event_preds)
+            for evaluate_document, event_preds in zip(evaluate_functions, task_event_preds)]
+
+
+def convert_and_evaluate(dataset_golden, datasets_predict, doc_split_nums, tasks, num_workers=1, half=False,
+                         doc_groups_list=None, doc_tasks=None):
+    """
+    read and parse every golden document once and evaluate all given tasks on it,
+    each task gets the same result collection as its own eval_{task}.py;
+    with doc_tasks the tasks share the predictions and doc_split_num of the joint prompts, see demux_task
+    """
+    modules = [TASK_MODULES[task] for task in tasks]
+    if doc_groups_list is None:
+        doc_groups_list = [None for _ in tasks]
+    parsers = [PredictionParser(module.PAIR_SEPARATOR, multi_target=doc_groups is not None)
+               for module, doc_groups in zip(modules, doc_groups_list)]
+    if doc_tasks is not None:
+        demuxed = [demux_task(task, dataset_predict, doc_split_num, doc_tasks, parser)
+                   for task, dataset_predict, doc_split_num, parser
+                   in zip(tasks, datasets_predict, doc_split_nums, parsers)]
+        datasets_predict, doc_split_nums, parsers = [list(items) for items in zip(*demuxed)]
+    slicers = [PredictionSlicer(dataset_predict, doc_split_num, parser, doc_groups)
+               for dataset_predict, doc_split_num, parser, doc_groups
+               in zip(datasets_predict, doc_split_nums, parsers, doc_groups_list)]
+    task_results = [module.init_results() for module in modules]
+    evaluate_functions = [partial(module.evaluate_document, half=True) if half and task in HALF_TASKS
+                          else module.evaluate_document for task, module in zip(tasks, modules)]
+
+    documents = iter_documents(dataset_golden, slicers, modules)
+    for doc_results in map_documents(partial(evaluate_tasks, evaluate_functions), documents, num_workers):
+        for module, results, doc_result in zip(modules, task_results, doc_results):
+            module.update_results(results, doc_result)
+
+    result_collections = []
+    for task, module, parser, slicer, results in zip(tasks, modules, parsers, slicers, task_results):
+        print(f"Task: {task}, examples: {slicer.num_examples}")
+        print(parser.summary())
+        result_collections.append(module.get_result_collection(results))
+    return result_collections
+
+
+def get_summary(tasks, result_collections):
+    """
+    the headline scores of every task: the micro average of the relation tasks, the coreference f1 scores
+    """
+    summary = {}
+    for task, result_collection in zip(tasks, result_collections):
+        for name, res in result_collection.items():
+            if task == "coref":
+                summary[name] = {metric: scores["f1"] for metric, scores in res.items() if metric != "mean_coref_f1"}
+                summary[name]["mean_coref_f1"] = res["mean_coref_f1"]
+            else:
+                summary[name] = {"precision": res["micro avg"]["precision"], "recall": res["micro avg"]["recall"],
+                                 "f1": res["micro avg"]["f1-score"]}
+    return summary
+
+
+def do_convert(args):
+    for predict_file in args.predict_files:
+        if not os.path.exists(predict_file):
+            raise ValueError(f"Please input the correct path of predict file: {predict_file}.")
+    if not os.path.exists(args.golden_file):
+        raise ValueError("Please input the correct path of golden file.")
+
+    doc_split_nums = []
+    for split_num_file in args.split_num_files:
+        with open(split_num_file, "r", encoding="utf-8") as f:
+            doc_split_nums.append(json.load(f))
+    doc_tasks = None
+    if args.tasks_file is not None:
+        with open(args.tasks_file, "r", encoding="utf-8") as f:
+            doc_tasks = json.load(f)
+    doc_groups_list = []
+    for groups_file in args.groups_files:
+        if groups_file is None:
+            doc_groups_list.append(None)
+        else:
+            with open(groups_file, "r", encoding="utf-8") as f:
+                doc_groups_list.append(json.load(f))
+
+    with ExitStack() as stack:
+        f_golden = stack.enter_context(open(args.golden_file, "r", encoding="utf-8"))
+        if doc_tasks is not None:
+            # the joint predictions are read once, the tasks walk them in lockstep document by document
+            f_predict = stack.enter_context(open(args.predict_files[0], "r", encoding="utf-8"))
+            f_predicts = itertools.tee(f_predict, len(args.tasks))
+        else:
+            f_predicts = [stack.enter_context(open(predict_file, "r", encoding="utf-8"))
+                          for predict_file in args.predict_files]
+        result_collections = convert_and_evaluate(f_golden, f_predicts, doc_split_nums, args.tasks,
+                                                  args.num_workers, args.half, doc_groups_list, doc_tasks)
+
+    for output_dir, result_collection in zip(args.output_dirs, result_collections):
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        with open(os.path.join(output_dir, "eval_results.json"), "w", encoding="utf-8") as outfile:
+            json.dump(result_collection, outfile, indent=4)
+
+    summary = get_summary(args.tasks, result_collections)
+    if not os.path.exists(args.summary_dir):
+        os.makedirs(args.summary_dir)
+    with open(os.path.join(args.summary_dir, "eval_summary.json"), "w", encoding="utf-8") as outfile:
+        json.dump(summary, outfile, indent=4)
+    for name, scores in summary.items():
+        print(f"{name}: " + ", ".join(f"{metric}={score * 100:.5f}" for metric, score in scores.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=str, nargs="+", default=list(TASK_MODULES.keys()),
+                        choices=list(TASK_MODULES.keys()), help="The tasks to evaluate in one pass over the data.")
+    parser.add_argument("--result_versions", type=str, nargs="+", default=None,
+                        help="The predict results of every task, MAVEN_ERE_{task} by default.")
+    parser.add_argument("--summary_version", type=str, default="MAVEN_ERE_all",
+                        help="The output/eval directory of the combined summary.")
+    parser.add_argument("--num_workers", type=int, default=1,
+                        help="Number of worker processes evaluating documents in parallel.")
+    parser.add_argument("--half", action="store_true",
+                        help="The temporal and subevent predictions are of the half prompts converted with --half.")
+    parser.add_argument("--multi_target", action="store_true",
+                        help="The predictions of the multi-target prompts converted with --targets_per_prompt.")
+    parser.add_argument("--joint", action="store_true",
+                        help="Evaluate every task on its section of the joint predictions in output/predict/"
+                             "{joint_version}, the results are written to {joint_version}_{task} by default.")
+    parser.add_argument("--joint_version", type=str, default="MAVEN_ERE_joint",
+                        help="The predict results of the joint prompts converted by convert_joint.py.")
+    args = parser.parse_args()
+    if args.half and args.multi_target:
+        parser.error("--half can not be combined with --multi_target")
+    if args.joint and (args.half or args.multi_target):
+        parser.error("--joint can not be combined with --half or --multi_target")
+
+    if args.result_versions is None:
+        prefix = args.joint_version if args.joint else "MAVEN_ERE"
+        args.result_versions = [f"{prefix}_{task}" for task in args.tasks]
+    if len(args.result_versions) != len(args.tasks):
+        raise ValueError("Please input one result version per task.")
+
+    file_dir = os.path.dirname(__file__)
+    args.project_path = os.path.abspath(os.path.join(file_dir, "../.."))
+    predict_versions = [args.joint_version] if args.joint else args.result_versions
+    args.predict_files = [os.path.join(args.project_path, "output/predict", predict_version,
+                                       "generated_predictions.jsonl") for predict_version in predict_versions]
+    args.golden_file = os.path.join(args.project_path,
+                                    f"data/MAVEN_ERE_split/test.jsonl")
+    task_dirs = [get_task_dir(task, args.half, args.multi_target, args.joint) for task in args.tasks]
+    args.split_num_files = [os.path.join(args.project_path, "data/converted/MAVEN_ERE", task_dir,
+                                         "test_doc_split_num.json") for task_dir in task_dirs]
+    args.groups_files = [os.path.join(args.project_path, "data/converted/MAVEN_ERE", task_dir, "test_doc_groups.json")
+                         if args.multi_target else None for task_dir in task_dirs]
+    args.tasks_file = None
+    if args.joint:
+        args.tasks_file = os.path.join(args.project_path, "data/converted/MAVEN_ERE/joint/test_doc_tasks.json")
+    args.output_dirs = [os.path.join(args.project_path, "output/eval", result_version)
+                        for result_version in args.result_versions]
+    args.summary_dir = os.path.join(args.project_path, "output/eval", args.summary_version)
+
+    do_convert(args)
+    print("finish")
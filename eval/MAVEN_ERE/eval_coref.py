@@ -1,238 +1,147 @@
 import argparse
 import os
 import json
-import copy
-import itertools
+from functools import partial
 from sklearn.metrics import classification_report
 
 from constant import *
-from utils import get_id2clusters
-from metrics import evaluate_documents, b_cubed, ceafe, muc, blanc
+from prediction_parser import PredictionParser
+from joint import demux_task
+from stream import DocumentStream, map_documents
+from utils import get_coref_clusters, get_iterative_clusters, count_event_mentions
+from metrics import evaluate_metrics, b_cubed, ceafe, muc, blanc
 
 coref_metrics = [b_cubed, ceafe, blanc, muc]
 coref_metric_names = ["B-cubed", "CEAF", "BLANC", "MUC"]
+PAIR_SEPARATOR = ", "
 
 
 class EvalResult:
-    def __init__(self, gold, mention_to_gold, clusters, mention_to_cluster):
+    def __init__(self, gold, mention_to_gold, clusters, mention_to_cluster, num_targets=None, num_asked_targets=None):
         self.gold = gold
         self.mention_to_gold = mention_to_gold
         self.clusters = clusters
         self.mention_to_cluster = mention_to_cluster
+        # the targets of the document and the targets asked by the cluster-level prompting
+        self.num_targets = num_targets
+        self.num_asked_targets = num_asked_targets
+
+
+def count_events(data):
+    return count_event_mentions(data)
+
+
+def evaluate_document(doc, event_preds, iterative=False):
+    rel_pred_dict = {}
+    for event, pairs_preds in zip(doc.events, event_preds):
+        for pairs_pred in pairs_preds:
+            e1_id = event["id"]
+
+            for label in COREFREL2ID.keys():
+                if label != "NONE":
+                    if label not in pairs_pred:
+                        print(f"label {label} does not exist")
+                        print(pairs_pred)
+                        continue
+
+                    for e2_map_id in pairs_pred[label]:
+                        try:
+                            e2_id = doc.event_num2id[e2_map_id] if e2_map_id.startswith("e") else doc.timex_num2id[
+                                e2_map_id]
+                            if (e1_id, e2_id) not in rel_pred_dict.keys():
+                                rel_pred_dict[(e1_id, e2_id)] = COREFREL2ID[label]
+                        except:
+                            print(f"event {e2_map_id} does not exist")
+
+    event_ids = [event["id"] for event in doc.events]
+    coref_label = COREFREL2ID["COREFERENCE"]
+    gold_clusters, gold_event2cluster = get_coref_clusters(doc.coref_dict, event_ids, coref_label)
+    if iterative:
+        pred_clusters, pred_event2cluster, asked = get_iterative_clusters(rel_pred_dict, event_ids, coref_label)
+        # the skipped targets have 0 prompts in doc_split_num, they have to be the ones skipped by the replay
+        prompted = [index for index, pairs_preds in enumerate(event_preds) if pairs_preds]
+        if asked != prompted:
+            raise ValueError(f"The asked targets of document {doc.id} differ from the prompted targets, "
+                             f"{len(set(asked) - set(prompted))} asked without prompts and "
+                             f"{len(set(prompted) - set(asked))} prompted but skipped; please evaluate the "
+                             f"predictions of coref_cluster.py with its test_doc_split_num.json.")
+        assert len(pred_event2cluster) == len(gold_event2cluster)
+        return EvalResult(gold_clusters, gold_event2cluster, pred_clusters, pred_event2cluster,
+                          len(event_ids), len(asked))
+    pred_clusters, pred_event2cluster = get_coref_clusters(rel_pred_dict, event_ids, coref_label)
+    assert len(pred_event2cluster) == len(gold_event2cluster)
+    return EvalResult(gold_clusters, gold_event2cluster, pred_clusters, pred_event2cluster)
 
 
-class Document:
-    def __init__(self, data, ignore_nonetype=False):
-        self.id = data["id"]
-        self.words = data["tokens"]
-        self.mentions = []
-        self.events = []
-        self.eid2mentions = {}
-
-        if "events" in data:
-            for e in data["events"]:
-                self.events += e["mention"]
-            for e in data["events"]:
-                self.eid2mentions[e["id"]] = e["mention"]
-        else:
-            self.events = copy.deepcopy(data['event_mentions'])
-
-        self.timexes = data["TIMEX"]
-        for t in data["TIMEX"]:
-            self.eid2mentions[t["id"]] = [t]
-        self.events_all = self.events + self.timexes
-
-        self.sort_events()
-        self.map_events()
-        self.map_timexes()
-
-        if "events" in data:
-            self.temporal_dict = self.load_relation_dict(data["temporal_relations"], TEMPREL2ID)
-            self.causal_dict = self.load_relation_dict(data["causal_relations"], CAUSALREL2ID)
-            self.subevent_dict = self.load_relation_dict({"SUBEVENT": data["subevent_relations"]}, SUBEVENTREL2ID)
-            self.coref_dict = self.load_coref_dict(data)
-
-    def sort_events(self):
-        self.events_all = sorted(self.events_all, key=lambda x: (x["sent_id"], x["offset"][0]))
-
-    def map_events(self):
-        self.events = sorted(self.events, key=lambda x: (x["sent_id"], x["offset"][0]))
-        self.event_num2id = {f"e{index}": e["id"] for index, e in enumerate(self.events)}
-        self.event_id2num = {e["id"]: f"e{index}" for index, e in enumerate(self.events)}
-
-    def map_timexes(self):
-        self.timexes = sorted(self.timexes, key=lambda x: (x["sent_id"], x["offset"][0]))
-        self.timex_num2id = {f"t{index}": t["id"] for index, t in enumerate(self.timexes)}
-        self.timex_id2num = {t["id"]: f"t{index}" for index, t in enumerate(self.timexes)}
-
-    def load_coref_dict(self, data):
-        pair2rel = {}
-        for event in data["events"]:
-            for mention1, mention2 in itertools.permutations(event["mention"], 2):
-                # coref is bidirectional
-                pair2rel[(mention1["id"], mention2["id"])] = COREFREL2ID["COREFERENCE"]
-        return pair2rel
-
-    def load_relation_dict(self, relations, REL2ID):
-        pair2rel = {}
-        for rel in relations:
-            for pair in relations[rel]:
-                # first mention as the event mention
-                for e1 in self.eid2mentions[pair[0]]:
-                    for e2 in self.eid2mentions[pair[1]]:
-                        pair2rel[(e1["id"], e2["id"])] = REL2ID[rel]
-                        if rel in BIDIRECTIONAL_REL:
-                            pair2rel[(e2["id"], e1["id"])] = REL2ID[rel]
-        return pair2rel
-
-
-def get_relation_labels(doc, pair2rel, ignore_timex=True):
-    labels = []
-    for i, e1 in enumerate(doc.events_all):
-        for j, e2 in enumerate(doc.events_all):
-            if i == j or e1["id"] == e2["id"]:
-                continue
-            if ignore_timex:
-                if e1["id"].startswith("TIME") or e2["id"].startswith("TIME"):
-                    labels.append(-100)
-                    continue
-            labels.append(pair2rel.get((e1["id"], e2["id"]), 0))
-    assert len(labels) == len(doc.events_all) ** 2 - len(doc.events_all)
-    return labels
-
-
-def filter_label(label_list):
-    new_label_list = []
-    for label in label_list:
-        if label != -100:
-            new_label_list.append(label)
-
-    return new_label_list
-
-
-def convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num):
-    rel_pred_list = []
-    coref_eval_results = []
-
-    pairs_dict_list = []
-    for data_predict in dataset_predict:
-        # get predict event pairs
-        data_json = json.loads(data_predict)
-        predict_text = data_json["predict"]
-        predict_text = predict_text.split("\n")[0]
-        relation_text_list = predict_text.strip().rstrip(".").split("; ")
-
-        pairs_dict = {}
-        for index, relation_text in enumerate(relation_text_list):
-            try:
-                relation_label = relation_text.split(": ")[0].lstrip(" ")
-                pairs = relation_text.split(": ")[1]
-                none_list = ["none", "none.", "NONE", "NONE.", "None", "None."]
-                if pairs in none_list:
-                    pairs_list = []
-                else:
-                    pairs_list = pairs.split(", ")
-            except:
-                pairs_list = []
-                print("*" * 10)
-                print(relation_text_list)
-                print(relation_text)
-                print("*" * 10)
-
-            pairs_list_new = [x.lstrip("<").rstrip(">").split(" ")[0] for x in pairs_list]
-            pairs_dict[relation_label] = pairs_list_new
-        pairs_dict_list.append(pairs_dict)
-    assert len(dataset_predict) == len(pairs_dict_list)
-    doc_split_num_sum = sum(doc_split_num)
-    assert doc_split_num_sum == len(dataset_predict)
-
-    start_index_events, start_index_examples = 0, 0
-    for data_golden in dataset_golden:
-        data_golden_json = json.loads(data_golden)
-        doc = Document(data_golden_json)
-
-        coref_labels = get_relation_labels(doc, doc.coref_dict, ignore_timex=True)
-
-        end_index_events = start_index_events + len(doc.events)
-        doc_split_num_item = doc_split_num[start_index_events: end_index_events]
-        start_index_events = end_index_events
-
-        rel_pred_dict = {}
-        for event, examples_num_item in zip(doc.events, doc_split_num_item):
-            end_index_examples = start_index_examples + examples_num_item
-            pairs_preds = pairs_dict_list[start_index_examples: end_index_examples]
-            start_index_examples = end_index_examples
-            for pairs_pred in pairs_preds:
-                e1_id = event["id"]
-
-                for label in COREFREL2ID.keys():
-                    if label != "NONE":
-                        if label not in pairs_pred:
-                            print(f"label {label} does not exist")
-                            print(pairs_pred)
-                            continue
-
-                        for e2_map_id in pairs_pred[label]:
-                            try:
-                                e2_id = doc.event_num2id[e2_map_id] if e2_map_id.startswith("e") else doc.timex_num2id[
-                                    e2_map_id]
-                                if (e1_id, e2_id) not in rel_pred_dict.keys():
-                                    rel_pred_dict[(e1_id, e2_id)] = COREFREL2ID[label]
-                            except:
-                                print(f"event {e2_map_id} does not exist")
-
-        coref_preds = get_relation_labels(doc, rel_pred_dict, ignore_timex=True)
+def init_results():
+    return []
 
-        coref_labels = filter_label(coref_labels)
-        coref_preds = filter_label(coref_preds)
-        assert len(coref_labels) == len(coref_preds)
 
-        doc_events = [i for i in range(len(doc.events))]
-        doc_event_pairs = []
-        for i, e1 in enumerate(doc_events):
-            for j, e2 in enumerate(doc_events):
-                if i == j or e1 == e2:
-                    continue
-                doc_event_pairs.append((e1, e2))
+def update_results(results, doc_result):
+    # in the document order, the metrics sum over the documents
+    results.append(doc_result)
 
-        assert len(doc_event_pairs) == len(coref_labels)
-        pred_clusters, pred_event2cluster = get_id2clusters(doc_event_pairs, coref_preds, doc_events)
-        gold_clusters, gold_event2cluster = get_id2clusters(doc_event_pairs, coref_labels, doc_events)
-        assert len(pred_event2cluster) == len(gold_event2cluster)
-        eval_result = EvalResult(gold_clusters, gold_event2cluster, pred_clusters, pred_event2cluster)
-        coref_eval_results.append(eval_result)
-    assert start_index_examples == len(pairs_dict_list)
-    print(f"rel_label_list: {len(pairs_dict_list)}")
 
-    result_collection = {"Coreference": {}}
+def get_result_collection(results):
+    name = "Coreference"
+    if results and results[0].num_asked_targets is not None:
+        # the absorbed targets are clustered by the answer of one asked target instead of mutual links
+        name = "Coreference (iterative)"
+        print(f"asked targets: {sum(res.num_asked_targets for res in results)}/"
+              f"{sum(res.num_targets for res in results)}, the cluster-level prompting trades the prompts of the "
+              f"absorbed targets for their mutual-link check, the scores are not comparable with the per-mention "
+              f"Coreference scores")
+    result_collection = {name: {}}
     mean_coref_f1 = 0.0
-    for coref_metric, coref_name in zip(coref_metrics, coref_metric_names):
-        res = evaluate_documents(coref_eval_results, coref_metric)
-        result_collection["Coreference"][coref_name] = {"precision": res[0], "recall": res[1], "f1": res[2]}
+    for res, coref_name in zip(evaluate_metrics(results, coref_metrics), coref_metric_names):
+        result_collection[name][coref_name] = {"precision": res[0], "recall": res[1], "f1": res[2]}
         mean_coref_f1 += res[2]
-        print(f"Coreference {coref_name}: precision={res[0] * 100:.5f}, recall={res[1] * 100:.5f}, "
+        print(f"{name} {coref_name}: precision={res[0] * 100:.5f}, recall={res[1] * 100:.5f}, "
               f"f1={res[2] * 100:.5f}")
     mean_coref_f1 /= len(coref_metric_names)
-    result_collection["Coreference"]["mean_coref_f1"] = mean_coref_f1
-    print(f"Coreference mean f1: {mean_coref_f1 * 100:.5f}")
+    result_collection[name]["mean_coref_f1"] = mean_coref_f1
+    print(f"{name} mean f1: {mean_coref_f1 * 100:.5f}")
 
     return result_collection
 
 
+def convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num, num_workers=1, doc_groups=None,
+                         doc_tasks=None, iterative=False):
+    results = init_results()
+    parser = PredictionParser(PAIR_SEPARATOR, multi_target=doc_groups is not None)
+    if doc_tasks is not None:
+        dataset_predict, doc_split_num, parser = demux_task("coref", dataset_predict, doc_split_num,
+                                                            doc_tasks, parser)
+    stream = DocumentStream(dataset_golden, dataset_predict, doc_split_num, count_events, parser, doc_groups)
+    for doc_result in map_documents(partial(evaluate_document, iterative=iterative), stream, num_workers):
+        update_results(results, doc_result)
+    print(f"rel_label_list: {stream.num_examples}")
+
+    print(parser.summary())
+    return get_result_collection(results)
+
+
 def do_convert(args):
     if not os.path.exists(args.predict_file):
         raise ValueError("Please input the correct path of predict file.")
     if not os.path.exists(args.golden_file):
         raise ValueError("Please input the correct path of predict file.")
 
-    with open(args.golden_file, "r", encoding="utf-8") as f:
-        dataset_golden = f.readlines()
-    with open(args.predict_file, "r", encoding="utf-8") as f:
-        dataset_predict = f.readlines()
     with open(args.split_num_file, "r", encoding="utf-8") as f:
         doc_split_num = json.load(f)
-
-    result_collection = convert_and_evaluate(dataset_golden, dataset_predict, doc_split_num)
+    doc_groups = None
+    if args.groups_file is not None:
+        with open(args.groups_file, "r", encoding="utf-8") as f:
+            doc_groups = json.load(f)
+    doc_tasks = None
+    if args.tasks_file is not None:
+        with open(args.tasks_file, "r", encoding="utf-8") as f:
+            doc_tasks = json.load(f)
+
+    with open(args.golden_file, "r", encoding="utf-8") as f_golden, \
+            open(args.predict_file, "r", encoding="utf-8") as f_predict:
+        result_collection = convert_and_evaluate(f_golden, f_predict, doc_split_num, args.num_workers, doc_groups,
+                                                 doc_tasks, args.iterative)
 
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
@@ -245,7 +154,22 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--result_version", type=str, default="MAVEN_ERE_coref",
                         help="The predict results, only support the JSON format.")
+    parser.add_argument("--num_workers", type=int, default=1,
+                        help="Number of worker processes evaluating documents in parallel.")
+    parser.add_argument("--multi_target", action="store_true",
+                        help="The predictions of the multi-target prompts converted with --targets_per_prompt.")
+    parser.add_argument("--joint", action="store_true",
+                        help="The predictions of the joint prompts converted by convert_joint.py, only the "
+                             "coref section is evaluated.")
+    parser.add_argument("--iterative", action="store_true",
+                        help="The predictions of the cluster-level prompting of coref_cluster.py: the asked targets "
+                             "are linked in both directions, a target named by an asked target of a confirmed "
+                             "cluster is absorbed without its own prompts. Fewer prompts for clusters built from one "
+                             "answer per absorbed target, reported as 'Coreference (iterative)' and not comparable "
+                             "with the per-mention scores.")
     args = parser.parse_args()
+    if sum([args.joint, args.multi_target, args.iterative]) > 1:
+        parser.error("--joint, --multi_target and --iterative can not be combined")
 
     file_dir = os.path.dirname(__file__)
     args.project_path = os.path.abspath(os.path.join(file_dir, "../.."))
@@ -253,8 +177,23 @@ if __name__ == "__main__":
                                      "generated_predictions.jsonl")
     args.golden_file = os.path.join(args.project_path,
                                     f"data/MAVEN_ERE_split/test.jsonl")
+    if args.joint:
+        task_dir = "joint"
+    elif args.multi_target:
+        task_dir = "coref_multi"
+    elif args.iterative:
+        task_dir = "coref_iterative"
+    else:
+        task_dir = "coref"
     args.split_num_file = os.path.join(args.project_path,
-                                       f"data/converted/MAVEN_ERE/coref/test_doc_split_num.json")
+                                       f"data/converted/MAVEN_ERE/{task_dir}/test_doc_split_num.json")
+    args.groups_file = None
+    if args.multi_target:
+        args.groups_file = os.path.join(args.project_path,
+                                        f"data/converted/MAVEN_ERE/{task_dir}/test_doc_groups.json")
+    args.tasks_file = None
+    if args.joint:
+        args.tasks_file = os.path.join(args.project_path, "data/converted/MAVEN_ERE/joint/test_doc_tasks.json")
     args.output_dir = os.path.join(args.project_path, "output/eval", args.result_version)
 
     do_convert(args)
@@ -0,0 +1,61 @@
+import itertools
+import json
+
+from constant import JOINT_SECTIONS
+
+
+class SectionParser:
+    """
+    parse the section of one task of a joint prediction with the PredictionParser of the task,
+    a prediction without the section of the task maps to {} and is counted as missing
+    """
+
+    def __init__(self, task, parser):
+        self.header = f"{JOINT_SECTIONS[task]}:"
+        self.headers = {f"{name}:" for name in JOINT_SECTIONS.values()}
+        self.parser = parser
+        self.num_missing_sections = 0
+
+    def get_section(self, predict_text):
+        lines = predict_text.split("\n")
+        stripped = [line.strip() for line in lines]
+        if self.header not in stripped:
+            return None
+        start = stripped.index(self.header) + 1
+        end = start
+        while end < len(lines) and stripped[end] not in self.headers:
+            end += 1
+        return "\n".join(lines[start:end]).strip()
+
+    def __call__(self, data_predict):
+        section = self.get_section(json.loads(data_predict)["predict"])
+        if section is None:
+            self.num_missing_sections += 1
+            return {}
+        return self.parser.parse_text(section)
+
+    def summary(self):
+        return self.parser.summary() + f", missing sections: {self.num_missing_sections}"
+
+
+def demux_predictions(dataset_predict, doc_split_num, doc_tasks, task):
+    """
+    the joint prediction lines of the targets asked for task, in their original order
+    """
+    predictions = iter(dataset_predict)
+    for split_num, tasks in zip(doc_split_num, doc_tasks):
+        for data_predict in itertools.islice(predictions, split_num):
+            if task in tasks:
+                yield data_predict
+    # every prediction belongs to a target of the joint prompts
+    assert next(predictions, None) is None
+
+
+def demux_task(task, dataset_predict, doc_split_num, doc_tasks, parser):
+    """
+    the predictions, doc_split_num and parser of one task from the joint prompts converted by convert_joint.py,
+    the result is evaluated like the predictions of the task's own prompts
+    """
+    task_split_num = [split_num for split_num, tasks in zip(doc_split_num, doc_tasks) if task in tasks]
+    return demux_predictions(dataset_predict, doc_split_num, doc_tasks, task), task_split_num, \
+        SectionParser(task, parser)
@@ -1,5 +1,6 @@
 import numpy as np
 from collections import Counter
+from functools import cached_property
 from scipy.optimize import linear_sum_assignment
 
 
@@ -22,9 +23,12 @@ class Evaluator:
         self.rn = 0
         self.wn = 0
 
-    def update(self, document):
+    def update(self, document, tables=None):
+        # tables: the ContingencyTables of the document, shared by the evaluators of several metrics
+        if tables is None:
+            tables = ContingencyTables(document)
         if self.metric == blanc:
-            rc, wc, rn, wn = self.metric(document.mention_to_cluster, document.mention_to_gold)
+            rc, wc, rn, wn = blanc_table(tables.blanc)
             self.rc += rc
             self.wc += wc
             self.rn += rn
@@ -32,6 +36,9 @@ class Evaluator:
         else:
             if self.metric == ceafe:
                 pn, pd, rn, rd = self.metric(document.clusters, document.gold)
+            elif self.metric in table_metrics:
+                pn, pd = table_metrics[self.metric](tables.precision)
+                rn, rd = table_metrics[self.metric](tables.recall)
             else:
                 pn, pd = self.metric(document.clusters, document.mention_to_gold)
                 rn, rd = self.metric(document.gold, document.mention_to_cluster)
@@ -67,36 +74,87 @@ def evaluate_documents(documents, metric, beta=1):
     return evaluator.get_precision(), evaluator.get_recall(), evaluator.get_f1()
 
 
+def evaluate_metrics(documents, metrics, beta=1):
+    """
+    (precision, recall, f1) of every metric, the contingency tables of a document are built once for all metrics
+    """
+    evaluators = [Evaluator(metric, beta=beta) for metric in metrics]
+    for document in documents:
+        tables = ContingencyTables(document)
+        for evaluator in evaluators:
+            evaluator.update(document, tables)
+    return [evaluator.get_prf() for evaluator in evaluators]
+
+
+class ContingencyTables:
+    """
+    the contingency tables between the predicted and the gold clusters of a document, computed on first use
+    """
+
+    def __init__(self, document):
+        self.document = document
+
+    @cached_property
+    def precision(self):
+        return get_contingency(self.document.clusters, self.document.mention_to_gold)
+
+    @cached_property
+    def recall(self):
+        return get_contingency(self.document.gold, self.document.mention_to_cluster)
+
+    @cached_property
+    def blanc(self):
+        return get_pair_contingency(self.document.mention_to_cluster, self.document.mention_to_gold)
+
+
+def get_contingency(clusters, mention_to_gold):
+    """
+    one pass over the mentions: for every cluster its size and a Counter of the gold clusters of its mentions,
+    the mentions without a gold cluster are not counted
+    """
+    return [(len(c), Counter(mention_to_gold[m] for m in c if m in mention_to_gold)) for c in clusters]
+
+
+def get_pair_contingency(mention_to_cluster, mention_to_gold):
+    """
+    the number of mentions of every (cluster, gold cluster) cell and the number of mentions
+    """
+    assert len(mention_to_cluster) == len(mention_to_gold)
+    return Counter((mention_to_cluster[m], mention_to_gold[m]) for m in mention_to_cluster), len(mention_to_cluster)
+
+
+def num_pairs(n):
+    return n * (n - 1) // 2
+
+
 def b_cubed(clusters, mention_to_gold):
+    return b_cubed_table(get_contingency(clusters, mention_to_gold))
+
+
+def b_cubed_table(contingency):
     num, dem = 0, 0
 
-    for c in clusters:
-        gold_counts = Counter()
+    for size, gold_counts in contingency:
         correct = 0
-        for m in c:
-            if m in mention_to_gold:
-                gold_counts[tuple(mention_to_gold[m])] += 1
-        for c2, count in gold_counts.items():
+        for count in gold_counts.values():
             correct += count * count
 
-        num += correct / float(len(c))
-        dem += len(c)
+        num += correct / float(size)
+        dem += size
 
     return num, dem
 
 
 def muc(clusters, mention_to_gold):
+    return muc_table(get_contingency(clusters, mention_to_gold))
+
+
+def muc_table(contingency):
     tp, p = 0, 0
-    for c in clusters:
-        p += len(c) - 1
-        tp += len(c)
-        linked = set()
-        for m in c:
-            if m in mention_to_gold:
-                linked.add(mention_to_gold[m])
-            else:
-                tp -= 1
-        tp -= len(linked)
+    for size, gold_counts in contingency:
+        p += size - 1
+        # the linked mentions minus the gold clusters they are linked to
+        tp += sum(gold_counts.values()) - len(gold_counts)
     return tp, p
 
 
@@ -105,55 +163,115 @@ def phi4(c1, c2):
 
 
 def ceafe(clusters, gold_clusters):
-    scores = np.zeros((len(gold_clusters), len(clusters)))
-    for i in range(len(gold_clusters)):
-        for j in range(len(clusters)):
-            scores[i, j] = phi4(gold_clusters[i], clusters[j])
-    row_id, col_id = linear_sum_assignment(-scores)
-    similarity = sum(scores[row_id, col_id])
+    """
+    only the nonzero phi4 similarities are built from a mention index, and the assignment is solved separately on
+    each connected component of the overlap graph; the clusters without any overlap never add to the similarity
+    """
+    mention_to_clusters = {}
+    for j, c in enumerate(clusters):
+        for m in set(c):
+            mention_to_clusters.setdefault(m, []).append(j)
+    overlaps = {}
+    for i, gold_cluster in enumerate(gold_clusters):
+        for m in gold_cluster:
+            for j in mention_to_clusters.get(m, []):
+                overlaps[(i, j)] = overlaps.get((i, j), 0) + 1
+
+    gold_edges, edges = {}, {}
+    for i, j in overlaps:
+        gold_edges.setdefault(i, []).append(j)
+        edges.setdefault(j, []).append(i)
+
+    matched = {}
+    visited = set()
+    for i in gold_edges:
+        if i in visited:
+            continue
+        # the gold and predicted clusters of the component of gold cluster i
+        rows, cols = [i], set()
+        visited.add(i)
+        queue = [("gold", i)]
+        while queue:
+            side, node = queue.pop()
+            if side == "gold":
+                for j in gold_edges[node]:
+                    if j not in cols:
+                        cols.add(j)
+                        queue.append(("pred", j))
+            else:
+                for i2 in edges[node]:
+                    if i2 not in visited:
+                        visited.add(i2)
+                        rows.append(i2)
+                        queue.append(("gold", i2))
+
+        scores = {(i2, j): 2 * overlaps[(i2, j)] / float(len(gold_clusters[i2]) + len(clusters[j]))
+                  for i2 in rows for j in gold_edges[i2]}
+        if len(scores) == 1:
+            # a single pair of overlapping clusters, e.g. two singletons of the same mention
+            matched[i] = scores.popitem()[1]
+            continue
+
+        rows, cols = sorted(rows), sorted(cols)
+        row_index = {row: index for index, row in enumerate(rows)}
+        col_index = {col: index for index, col in enumerate(cols)}
+        component = np.zeros((len(rows), len(cols)))
+        for (i2, j), score in scores.items():
+            component[row_index[i2], col_index[j]] = score
+        row_id, col_id = linear_sum_assignment(-component)
+        for r, c in zip(row_id, col_id):
+            if component[r, c] > 0:
+                matched[rows[r]] = component[r, c]
+
+    # summed in the order of the gold clusters like the dense assignment
+    similarity = 0
+    for i in sorted(matched):
+        similarity += matched[i]
     return similarity, len(clusters), similarity, len(gold_clusters)
 
 
 def lea(clusters, mention_to_gold):
+    return lea_table(get_contingency(clusters, mention_to_gold))
+
+
+def lea_table(contingency):
     num, dem = 0, 0
-    for c in clusters:
-        if len(c) == 1:
+    for size, gold_counts in contingency:
+        if size == 1:
             continue
-        common_links = 0
-        all_links = len(c) * (len(c) - 1) / 2.0
-        for i, m in enumerate(c):
-            if m in mention_to_gold:
-                for m2 in c[i + 1:]:
-                    if m2 in mention_to_gold and mention_to_gold[m] == mention_to_gold[m2]:
-                        common_links += 1
-        num += len(c) * common_links / float(all_links)
-        dem += len(c)
+        common_links = sum(num_pairs(count) for count in gold_counts.values())
+        all_links = size * (size - 1) / 2.0
+        num += size * common_links / float(all_links)
+        dem += size
     return num, dem
 
 
 def blanc(mention_to_cluster, mention_to_gold):
-    rc = 0
-    wc = 0
-    rn = 0
-    wn = 0
-    assert len(mention_to_cluster) == len(mention_to_gold)
-    mentions = list(mention_to_cluster.keys())
-    for i in range(len(mentions)):
-        for j in range(i + 1, len(mentions)):
-            if mention_to_cluster[mentions[i]] == mention_to_cluster[mentions[j]]:
-                if mention_to_gold[mentions[i]] == mention_to_gold[mentions[j]]:
-                    rc += 1
-                else:
-                    wc += 1
-            else:
-                if mention_to_gold[mentions[i]] == mention_to_gold[mentions[j]]:
-                    wn += 1
-                else:
-                    rn += 1
+    return blanc_table(get_pair_contingency(mention_to_cluster, mention_to_gold))
+
+
+def blanc_table(pair_contingency):
+    """
+    the pairs of mentions in the same/different clusters and gold clusters from the cell sizes, without visiting the pairs
+    """
+    cells, num_mentions = pair_contingency
+    cluster_sizes, gold_sizes = Counter(), Counter()
+    for (cluster, gold), count in cells.items():
+        cluster_sizes[cluster] += count
+        gold_sizes[gold] += count
+
+    rc = sum(num_pairs(count) for count in cells.values())
+    wc = sum(num_pairs(size) for size in cluster_sizes.values()) - rc
+    wn = sum(num_pairs(size) for size in gold_sizes.values()) - rc
+    rn = num_pairs(num_mentions) - rc - wc - wn
     return rc, wc, rn, wn
 
 
+table_metrics = {b_cubed: b_cubed_table, muc: muc_table, lea: lea_table}
+
+
 if __name__ == "__main__":
+    import random
     from utils import get_event2cluster
 
 
@@ -178,3 +296,111 @@ if __name__ == "__main__":
     print(p, r, f)
     p, r, f = evaluate_documents([doc], blanc)
     print(p, r, f)
+
+    # the mention-level implementations, the contingency tables must give exactly the same numbers
+    def b_cubed_mentions(clusters, mention_to_gold):
+        num, dem = 0, 0
+        for c in clusters:
+            gold_counts = Counter()
+            correct = 0
+            for m in c:
+                if m in mention_to_gold:
+                    gold_counts[tuple(mention_to_gold[m])] += 1
+            for c2, count in gold_counts.items():
+                correct += count * count
+            num += correct / float(len(c))
+            dem += len(c)
+        return num, dem
+
+
+    def muc_mentions(clusters, mention_to_gold):
+        tp, p = 0, 0
+        for c in clusters:
+            p += len(c) - 1
+            tp += len(c)
+            linked = set()
+            for m in c:
+                if m in mention_to_gold:
+                    linked.add(mention_to_gold[m])
+                else:
+                    tp -= 1
+            tp -= len(linked)
+        return tp, p
+
+
+    def lea_mentions(clusters, mention_to_gold):
+        num, dem = 0, 0
+        for c in clusters:
+            if len(c) == 1:
+                continue
+            common_links = 0
+            all_links = len(c) * (len(c) - 1) / 2.0
+            for i, m in enumerate(c):
+                if m in mention_to_gold:
+                    for m2 in c[i + 1:]:
+                        if m2 in mention_to_gold and mention_to_gold[m] == mention_to_gold[m2]:
+                            common_links += 1
+            num += len(c) * common_links / float(all_links)
+            dem += len(c)
+        return num, dem
+
+
+    def blanc_mentions(mention_to_cluster, mention_to_gold):
+        rc, wc, rn, wn = 0, 0, 0, 0
+        mentions = list(mention_to_cluster.keys())
+        for i in range(len(mentions)):
+            for j in range(i + 1, len(mentions)):
+                if mention_to_cluster[mentions[i]] == mention_to_cluster[mentions[j]]:
+                    if mention_to_gold[mentions[i]] == mention_to_gold[mentions[j]]:
+                        rc += 1
+                    else:
+                        wc += 1
+                else:
+                    if mention_to_gold[mentions[i]] == mention_to_gold[mentions[j]]:
+                        wn += 1
+                    else:
+                        rn += 1
+        return rc, wc, rn, wn
+
+
+    def ceafe_dense(clusters, gold_clusters):
+        scores = np.zeros((len(gold_clusters), len(clusters)))
+        for i in range(len(gold_clusters)):
+            for j in range(len(clusters)):
+                scores[i, j] = phi4(gold_clusters[i], clusters[j])
+        row_id, col_id = linear_sum_assignment(-scores)
+        similarity = sum(scores[row_id, col_id])
+        return similarity, len(clusters), similarity, len(gold_clusters)
+
+
+    def random_clusters(mentions, rng):
+        clusters = {}
+        for m in mentions:
+            clusters.setdefault(rng.randrange(len(mentions)), []).append(m)
+        return list(clusters.values())
+
+
+    rng = random.Random(0)
+    for _ in range(2000):
+        mentions = list(range(rng.randint(1, 30)))
+        pred = random_clusters(mentions, rng)
+        gold = random_clusters(mentions, rng)
+        mention2cluster = get_event2cluster(pred)
+        mention2gold = get_event2cluster(gold)
+        # clusters with mentions that are not in the other side
+        partial_gold = {m: c for m, c in mention2gold.items() if rng.random() < 0.8}
+        for clusters, mention_to_gold in [(pred, mention2gold), (gold, mention2cluster), (pred, partial_gold)]:
+            assert b_cubed(clusters, mention_to_gold) == b_cubed_mentions(clusters, mention_to_gold)
+            assert muc(clusters, mention_to_gold) == muc_mentions(clusters, mention_to_gold)
+            assert lea(clusters, mention_to_gold) == lea_mentions(clusters, mention_to_gold)
+        assert blanc(mention2cluster, mention2gold) == blanc_mentions(mention2cluster, mention2gold)
+        partial_pred = [c for c in pred if rng.random() < 0.8]
+        for clusters, gold_clusters in [(pred, gold), (gold, pred), (partial_pred, gold)]:
+            # equally good assignments may be summed in another order, up to rounding
+            sparse_res, dense_res = ceafe(clusters, gold_clusters), ceafe_dense(clusters, gold_clusters)
+            assert abs(sparse_res[0] - dense_res[0]) < 1e-9 and sparse_res[1:: 2] == dense_res[1:: 2]
+
+        docs = [Doc(mention2cluster, mention2gold, pred, gold)]
+        metrics = [b_cubed, ceafe, blanc, muc, lea]
+        assert evaluate_metrics(docs, metrics) == [evaluate_documents(docs, metric) for metric in metrics]
+    print("randomized checks passed")
@@ -0,0 +1,112 @@
+import itertools
+import json
+from functools import partial
+from multiprocessing import Pool
+
+from document import Document
+
+
+class PredictionSlicer:
+    """
+    hand out the lazily parsed predictions document by document, following doc_split_num
+    """
+
+    def __init__(self, dataset_predict, doc_split_num, parse_prediction, doc_groups=None):
+        # doc_groups: the target map ids of the multi-target prompts, doc_split_num then counts the prompts per group
+        # and parse_prediction is a PredictionParser(multi_target=True)
+        self.predictions = map(parse_prediction, dataset_predict)
+        self.doc_split_num = doc_split_num
+        self.parse_prediction = parse_prediction
+        self.doc_groups = doc_groups
+        self.start_index_events = 0
+        self.num_examples = 0
+
+    def take(self, num_events):
+        """
+        the predictions of the next num_events events, one list of parsed predictions per event
+        """
+        if self.doc_groups is not None:
+            return self.take_groups(num_events)
+
+        end_index_events = self.start_index_events + num_events
+        doc_split_num_item = self.doc_split_num[self.start_index_events: end_index_events]
+        self.start_index_events = end_index_events
+
+        event_preds = []
+        for examples_num_item in doc_split_num_item:
+            pairs_preds = list(itertools.islice(self.predictions, examples_num_item))
+            self.num_examples += len(pairs_preds)
+            event_preds.append(pairs_preds)
+        return event_preds
+
+    def take_groups(self, num_events):
+        # the groups never span two documents, start_index_events counts the groups here
+        event_preds = []
+        while len(event_preds) < num_events:
+            map_ids = self.doc_groups[self.start_index_events]
+            targets_dicts = list(itertools.islice(self.predictions, self.doc_split_num[self.start_index_events]))
+            self.start_index_events += 1
+            self.num_examples += len(targets_dicts)
+            event_preds.extend(self.parse_prediction.get_target_preds(targets_dicts, map_ids))
+        assert len(event_preds) == num_events
+        return event_preds
+
+    def finish(self):
+        # every prediction belongs to an event of the golden documents
+        assert next(self.predictions, None) is None
+        assert sum(self.doc_split_num) == self.num_examples
+
+
+class DocumentStream:
+    """
+    walk the golden documents together with their slice of doc_split_num and the lazily parsed predictions,
+    only the golden line and the predictions of the current document are held in memory
+    """
+
+    def __init__(self, dataset_golden, dataset_predict, doc_split_num, count_events, parse_prediction,
+                 doc_groups=None):
+        # dataset_golden/dataset_predict: iterables of JSON lines, e.g. the open files
+        # count_events(data): the number of events of a golden document, i.e. the length of its doc_split_num slice
+        self.dataset_golden = dataset_golden
+        self.count_events = count_events
+        self.slicer = PredictionSlicer(dataset_predict, doc_split_num, parse_prediction, doc_groups)
+
+    @property
+    def num_examples(self):
+        return self.slicer.num_examples
+
+    def __iter__(self):
+        """
+        yield (data, event_preds) per golden document, event_preds[i] are the parsed predictions of its i-th event
+        """
+        for data_golden in self.dataset_golden:
+            data = json.loads(data_golden)
+            yield data, self.slicer.take(self.count_events(data))
+        self.slicer.finish()
+
+
+def evaluate_item(evaluate_document, item):
+    data, event_preds = item
+    return evaluate_document(Document(data), event_preds)
+
+
+def map_documents(evaluate_document, stream, num_workers=1, chunksize=8):
+    """
+    yield evaluate_document(Document(data), event_preds) for every document of the stream, in the original document
+    order; the stream itself is read and parsed in the main process. the pool is fed window by window, so at most
+    num_workers * chunksize documents and their predictions are held in memory at once
+    """
+    worker = partial(evaluate_item, evaluate_document)
+    if num_workers <= 1:
+        for item in stream:
+            yield worker(item)
+    else:
+        stream = iter(stream)
+        with Pool(num_workers) as pool:
+            # Pool.imap reads its whole input ahead of the workers, the window keeps the stream lazy
+            while True:
+                window = list(itertools.islice(stream, num_workers * chunksize))
+                if not window:
+                    break
+                for result in pool.imap(worker, window, chunksize=chunksize):
+                    yield result
@@ -1,4 +1,4 @@
-import copy
+from union_find import UnionFind, ConfirmedClusters
 
 
 def get_clusters(event2cluster):
@@ -11,41 +11,98 @@ def get_id2clusters(doc_pairs, doc_pred, doc_events):
     """
     obtain coreference clusters
     """
-
-    idx_to_clusters = {}
-    for event_id in doc_events:
-        item_set = set()
-        item_set.add(event_id)
-        idx_to_clusters[event_id] = item_set
-
     coref_pairs = set()
     for pair_item, pair_pred in zip(doc_pairs, doc_pred):
         if pair_pred == 1:
             coref_pairs.add((pair_item[0], pair_item[1]))
 
-    new_coref_pairs = copy.deepcopy(coref_pairs)
-    for item in coref_pairs:
-        reverse_item = (item[1], item[0])
-        if reverse_item not in coref_pairs:
-            new_coref_pairs.remove(item)
-
-    # remove duplicate elements
-    samplify_coref_pairs = set()
-    for item in new_coref_pairs:
-        if item[0] < item[1]:
-            samplify_coref_pairs.add(item)
-        else:
-            reverse_item = (item[1], item[0])
-            samplify_coref_pairs.add(reverse_item)
-
-    # set union
-    for item in samplify_coref_pairs:
-        union_cluster = set.union(idx_to_clusters[item[0]], idx_to_clusters[item[1]])
-        for j in union_cluster:
-            idx_to_clusters[j] = union_cluster
-
-    idx_to_clusters = {i: tuple(sorted(idx_to_clusters[i])) for i in idx_to_clusters}
+    # only the pairs linked in both directions
+    links = [item for item in coref_pairs if (item[1], item[0]) in coref_pairs]
+    return get_union_clusters(links, doc_events)
+
+
+def get_coref_clusters(pair2rel, event_ids, coref_label=1):
+    """
+    obtain coreference clusters from the sparse {(e1_id, e2_id): label} dict, the events are linked if both directions
+    are labeled coref_label; the clusters hold the indexes of event_ids like get_id2clusters with range(len(event_ids))
+    """
+    event_id2index = {event_id: index for index, event_id in enumerate(event_ids)}
+    links = []
+    for (e1_id, e2_id), rel in pair2rel.items():
+        # the pairs with timexes are ignored
+        if rel == coref_label and e1_id != e2_id and e1_id in event_id2index and e2_id in event_id2index \
+                and pair2rel.get((e2_id, e1_id)) == coref_label:
+            links.append((event_id2index[e1_id], event_id2index[e2_id]))
+    return get_union_clusters(links, range(len(event_ids)))
+
+
+def get_union_find_clusters(union_find):
+    """
+    the clusters of a union-find and the map from every event to its sorted cluster tuple
+    """
+    root2cluster = {root: tuple(sorted(cluster)) for root, cluster in union_find.get_members().items()}
+
+    idx_to_clusters = {i: root2cluster[union_find.find(i)] for i in union_find.parent}
     predicted_clusters = get_clusters(idx_to_clusters)
     return predicted_clusters, idx_to_clusters
 
 
+def get_union_clusters(links, doc_events):
+    """
+    union-find over the linked events, returns the clusters and the map from every event to its sorted cluster tuple
+    """
+    union_find = UnionFind(doc_events)
+    for e1, e2 in links:
+        union_find.union(e1, e2)
+    return get_union_find_clusters(union_find)
+
+
+def get_iterative_clusters(pair2rel, event_ids, coref_label=1):
+    """
+    the clusters of the cluster-level prompting of coref_cluster.py, see ConfirmedClusters: the events are asked in
+    order, the asked events are linked in both directions like in get_coref_clusters, an event named by an asked event
+    of a confirmed cluster is absorbed and skipped; returns the clusters like get_coref_clusters and the indexes of
+    the asked events
+    """
+    event_id2index = {event_id: index for index, event_id in enumerate(event_ids)}
+    target_links = [[] for _ in event_ids]
+    for (e1_id, e2_id), rel in pair2rel.items():
+        # the pairs with timexes are ignored
+        if rel == coref_label and e1_id != e2_id and e1_id in event_id2index and e2_id in event_id2index:
+            target_links[event_id2index[e1_id]].append(event_id2index[e2_id])
+
+    clusters = ConfirmedClusters(range(len(event_ids)))
+    asked = []
+    for index, links in enumerate(target_links):
+        if clusters.absorb(index):
+            continue
+        clusters.ask(index)
+        asked.append(index)
+        for e2 in links:
+            clusters.add_link(index, e2)
+    predicted_clusters, idx_to_clusters = get_union_find_clusters(clusters.union_find)
+    return predicted_clusters, idx_to_clusters, asked
+
+
+def count_event_mentions(data, with_timexes=False):
+    """
+    number of event mentions of a golden document (and its timexes), as listed in the Document of the evaluators
+    """
+    if "events" in data:
+        num_events = sum(len(e["mention"]) for e in data["events"])
+    else:
+        num_events = len(data["event_mentions"])
+    if with_timexes:
+        num_events += len(data["TIMEX"])
+    return num_events
+
+
+def get_event2cluster(clusters):
+    """
+    map every event to its cluster, the clusters are stored as tuples like in get_id2clusters
+    """
+    event2cluster = {}
+    for cluster in clusters:
+        for event_id in cluster:
+            event2cluster[event_id] = tuple(cluster)
+    return event2cluster